@@ -1,18 +1,38 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from BookApp.models import Author, Category, Book, UserComment, Rating, FavBook, ReadList
+from BookApp.models import Author, Category, Book, UserComment
 
-class AdminUserSerializer(serializers.ModelSerializer):
+class SparseFieldsetSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer limited to the field names in context['fields'] when the
+    view passes them (see AdminApp.views.SparseFieldsetMixin). Otherwise it
+    shows every field except those in Meta.default_exclude.
+    """
+
+    def all_fields(self):
+        return super().get_fields()
+
+    def get_fields(self):
+        fields = self.all_fields()
+        selected = self.context.get('fields')
+        if selected is None:
+            excluded = getattr(self.Meta, 'default_exclude', ())
+            return {name: field for name, field in fields.items() if name not in excluded}
+        return {name: fields[name] for name in selected}
+
+class AdminUserSerializer(SparseFieldsetSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser']
 
-class AdminBookSerializer(serializers.ModelSerializer):
+class AdminBookSerializer(SparseFieldsetSerializer):
     class Meta:
         model = Book
         fields = '__all__'
+        # The embedding is hundreds of numbers per book; ask for it with ?fields=.
+        default_exclude = ['embedding']
 
-class AdminAuthorSerializer(serializers.ModelSerializer):
+class AdminAuthorSerializer(SparseFieldsetSerializer):
     class Meta:
         model = Author
         fields = '__all__'
@@ -22,10 +42,10 @@ class AdminCategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name']
 
-class AdminUserCommentSerializer(serializers.ModelSerializer):
+class AdminUserCommentSerializer(SparseFieldsetSerializer):
     user = serializers.StringRelatedField()
     book = serializers.StringRelatedField()
 
     class Meta:
         model = UserComment
-        fields = ['id', 'content', 'date', 'user', 'book']
\ No newline at end of file
+        fields = ['id', 'content', 'date', 'user', 'book']
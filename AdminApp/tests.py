@@ -1,4 +1,6 @@
-from django.test import TestCase,override_settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from BookApp.models import Book,Category,UserComment,Author
@@ -114,7 +116,7 @@ class SensitiveDataExposureTests(TestCase):
         self.client.force_authenticate(user=self.admin_user)
         response = self.client.get(self.admin_users_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        for user_data in response.data:
+        for user_data in response.data['results']:
             self.assertNotIn('password', user_data)
             self.assertNotIn('password1', user_data)
             self.assertNotIn('password2', user_data)
@@ -184,4 +186,37 @@ class AdminAPIAuthorizationTests(TestCase):
         response = self.client.patch(self.admin_categories_detail_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.category.refresh_from_db()
-        self.assertNotEqual(self.category.name, 'Hacked Category Name')
\ No newline at end of file
+        self.assertNotEqual(self.category.name, 'Hacked Category Name')
+
+
+class AdminListingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username='adminuser', email='admin@example.com', password='AdminPass123')
+        self.client.force_authenticate(user=self.admin_user)
+        author = Author.objects.create(name='Test Author')
+        category = Category.objects.create(name='Test Category')
+        self.books = [
+            Book.objects.create(title=f'Book {i}', author=author, category=category, summary='Summary', page_count=100)
+            for i in range(3)
+        ]
+        UserComment.objects.create(user=self.admin_user, book=self.books[0], content='Nice')
+
+    def test_book_list_is_paginated_without_embeddings(self):
+        response = self.client.get(reverse('admin-books-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn('embedding', response.data['results'][0])
+
+    def test_sparse_fieldset_limits_fields_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin-books-list'), {'fields': 'id,title'})
+        self.assertEqual(response.data['results'][0], {'id': self.books[0].id, 'title': 'Book 0'})
+        self.assertNotIn('summary', queries[-1]['sql'])
+
+        response = self.client.get(reverse('admin-user-comments-list'), {'fields': 'content,user'})
+        self.assertEqual(response.data['results'], [{'content': 'Nice', 'user': 'adminuser'}])
+
+        response = self.client.get(reverse('admin-books-list'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,23 +5,78 @@ from BookApp.models import Book,Author,Category,UserComment
 from .serializers import AdminBookSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 
-class AdminUserViewSet(viewsets.ModelViewSet):
+
+class AdminPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class SparseFieldsetMixin:
+    """
+    For reads, `?fields=id,title` picks the serialized fields and the columns
+    the queryset loads to match; without it the serializer's default fields
+    are loaded. Serializer fields that are not plain model columns name the
+    columns they read in `field_columns`; related columns are joined in with
+    select_related.
+    """
+    field_columns = {}
+
+    def selected_fields(self):
+        """The field names asked for with ?fields=, or None for the defaults."""
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+        requested = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+        unknown = set(requested) - set(self.get_serializer_class()().all_fields())
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return requested
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method == 'GET':
+            context['fields'] = self.selected_fields()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None or self.request.method != 'GET':
+            return queryset
+        fields = self.get_serializer_class()(context={'fields': self.selected_fields()}).fields
+        columns = {queryset.model._meta.pk.name}
+        for name, field in fields.items():
+            columns.update(self.field_columns.get(name, [field.source]))
+        # Only the relations whose columns are loaded may be joined; deferring a
+        # foreign key that select_related still follows is an error.
+        queryset = queryset.select_related(None)
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+
+class AdminUserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing user instances.
     Only accessible by admin users.
     """
     serializer_class = AdminUserSerializer
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
+    pagination_class = AdminPagination
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
-class AdminBookViewSet(viewsets.ModelViewSet):
+class AdminBookViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing book instances.
     Only accessible by admin users.
     """
     serializer_class = AdminBookSerializer
-    queryset = Book.objects.all()
+    queryset = Book.objects.order_by('id')
+    pagination_class = AdminPagination
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
 class AdminCategoryViewSet(viewsets.ModelViewSet):
@@ -38,13 +93,16 @@ class AdminCategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name']
     ordering = ['name']
 
-class AdminUserCommentViewSet(viewsets.ModelViewSet):
+class AdminUserCommentViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     Admin API for managing user comments.
     Allows viewing, editing, and deleting inappropriate comments.
     """
     queryset = UserComment.objects.select_related('user', 'book').all()
     serializer_class = AdminUserCommentSerializer
+    pagination_class = AdminPagination
+    # Shown through User.__str__ and Book.__str__.
+    field_columns = {'user': ['user__username'], 'book': ['book__title']}
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -53,12 +111,13 @@ class AdminUserCommentViewSet(viewsets.ModelViewSet):
     ordering_fields = ['date', 'user__username', 'book__title']
     ordering = ['-date']
 
-class AdminAuthorViewSet(viewsets.ModelViewSet):
+class AdminAuthorViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     Admin API for managing authors.
     """
     queryset = Author.objects.all()
     serializer_class = AdminAuthorSerializer
+    pagination_class = AdminPagination
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
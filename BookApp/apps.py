@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BookappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "BookApp"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
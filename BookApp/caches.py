@@ -0,0 +1,225 @@
+import secrets
+import threading
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import Count
+from django.utils.connection import ConnectionProxy
+from rest_framework.renderers import JSONRenderer
+from .models import Category
+from .serializers import BookSerializer, CategorySerializer
+
+
+class VersionStamp:
+    """
+    Integer version kept in the Django cache, shared by every worker that
+    points at the same cache. In-process copies remember the version they were
+    built from and reload once it moves.
+
+    A stamp that is missing (evicted, or lost with a cache restart) starts
+    again from a random value rather than from 1, so a copy tagged with an
+    older version can never match it again. Bumps only reach other processes
+    through a shared cache backend; see CACHES in settings.
+    """
+
+    def __init__(self, key, backend=None):
+        self.key = key
+        self.cache = backend if backend is not None else cache
+
+    @staticmethod
+    def _seed():
+        return secrets.randbits(62)
+
+    def current(self):
+        version = self.cache.get(self.key)
+        if version is None:
+            seed = self._seed()
+            self.cache.add(self.key, seed, timeout=None)
+            version = self.cache.get(self.key, seed)
+        return version
+
+    async def acurrent(self):
+        version = await self.cache.aget(self.key)
+        if version is None:
+            seed = self._seed()
+            await self.cache.aadd(self.key, seed, timeout=None)
+            version = await self.cache.aget(self.key, seed)
+        return version
+
+    def bump(self):
+        """Move to a new version and return it."""
+        try:
+            return self.cache.incr(self.key)
+        except ValueError:
+            seed = self._seed()
+            self.cache.set(self.key, seed, timeout=None)
+            return seed
+
+
+class CategoryCatalog:
+    """
+    In-process copy of the serialized category list with per-category book counts.
+
+    Entries are tagged with a catalog version kept in the Django cache. Writes to
+    Book or Category bump that version (see signals.py), so every worker notices
+    the change on its next read and reloads; until then reads never touch the
+    database.
+    """
+
+    def __init__(self):
+        self.stamp = VersionStamp('bookapp:category-catalog:version')
+        self._lock = threading.Lock()
+        self._version = None
+        self._items = []
+        self._by_id = {}
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self):
+        self.stamp.bump()
+        with self._lock:
+            self._version = None
+
+    def _fresh(self):
+        version = self.stamp.current()
+        with self._lock:
+            if self._version == version:
+                self.hits += 1
+                return self._items, self._by_id
+            self.misses += 1
+        categories = Category.objects.annotate(book_count=Count('book_category')).order_by('id')
+        items = CategorySerializer(categories, many=True).data
+        by_id = {item['id']: item for item in items}
+        with self._lock:
+            self._version, self._items, self._by_id = version, items, by_id
+        return items, by_id
+
+    def all(self):
+        return self._fresh()[0]
+
+    def get(self, category_id):
+        return self._fresh()[1].get(category_id)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self._version,
+                'size': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+class BookFragmentCache:
+    """
+    Rendered BookSerializer JSON per book, in the `alias` Django cache.
+
+    A fragment is stored under the book's own version token and a generation
+    shared by all books. Writes to a book replace its token after commit
+    (invalidate); changes that reach many books at once, such as renaming an
+    author or category, move the generation instead (invalidate_all). Tokens
+    are read before the rows are loaded, so a fragment rendered from rows read
+    before a write is filed under a token nobody asks for anymore.
+
+    Tokens, fragments and the generation all live in that one cache, which
+    must be shared by every process serving requests: a token replaced in
+    one process's local memory leaves the others serving stale fragments.
+    """
+
+    def __init__(self, ttl, alias='book_fragments'):
+        self.ttl = ttl
+        self.cache = ConnectionProxy(caches, alias)
+        self.generation = VersionStamp('bookapp:book-fragments:generation', backend=self.cache)
+        self.renderer = JSONRenderer()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _token_key(self, book_id):
+        return f'bookapp:book-fragments:token:{book_id}'
+
+    async def _keys(self, book_ids):
+        # {book_id: fragment key} under the current tokens.
+        generation = await self.generation.acurrent()
+        keys = {self._token_key(book_id): book_id for book_id in book_ids}
+        found = await self.cache.aget_many(keys)
+        for key in keys.keys() - found.keys():
+            # add() keeps whichever token a concurrent reader or writer set first.
+            await self.cache.aadd(key, uuid.uuid4().hex, timeout=None)
+            found[key] = await self.cache.aget(key)
+        return {book_id: f'bookapp:book-fragments:{generation}:{book_id}:{found[key]}' for key, book_id in keys.items()}
+
+    async def fragments(self, book_ids, load):
+        """
+        Rendered JSON of each book, in order. Hits come from the cache; the
+        rest are loaded with `await load(missing_ids)`, which returns
+        {book_id: Book} ready for BookSerializer, rendered, and written back
+        with one set_many. Books `load` no longer finds are left out.
+        """
+        keys = await self._keys(book_ids)
+        cached = await self.cache.aget_many(keys.values())
+        missing = [book_id for book_id in book_ids if keys[book_id] not in cached]
+        rendered = {}
+        if missing:
+            books = await load(missing)
+            rendered = {keys[book_id]: self.renderer.render(BookSerializer(book).data) for book_id, book in books.items()}
+            await self.cache.aset_many(rendered, timeout=self.ttl)
+        with self._lock:
+            self.hits += len(book_ids) - len(missing)
+            self.misses += len(missing)
+        fragments = []
+        for book_id in book_ids:
+            fragment = cached.get(keys[book_id]) or rendered.get(keys[book_id])
+            if fragment is not None:
+                fragments.append(fragment)
+        return fragments
+
+    def invalidate(self, book_ids):
+        """Retire the books' fragments once the current transaction commits."""
+        book_ids = list(book_ids)
+        transaction.on_commit(
+            lambda: self.cache.set_many({self._token_key(book_id): uuid.uuid4().hex for book_id in book_ids}, timeout=None)
+        )
+
+    def invalidate_all(self):
+        transaction.on_commit(self.generation.bump)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+_stats_sources = {}
+
+
+def register_stats(name, source):
+    """Expose `source()` under `name` in the admin cache-stats endpoint."""
+    _stats_sources[name] = source
+
+
+def cache_stats():
+    return {name: source() for name, source in _stats_sources.items()}
+
+
+# Moves whenever a book, author or category row, or their counters, change:
+# the validator of every public catalog response (see conditional.py).
+catalog_stamp = VersionStamp('bookapp:catalog:version')
+
+
+def comment_stamp(book_id):
+    """Moves whenever a comment on the book is added or removed."""
+    return VersionStamp(f'bookapp:comments:version:{book_id}')
+
+
+category_catalog = CategoryCatalog()
+register_stats('category_catalog', category_catalog.stats)
+book_fragments = BookFragmentCache(ttl=settings.BOOK_FRAGMENT_CACHE_TTL)
+register_stats('book_fragments', book_fragments.stats)
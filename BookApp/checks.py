@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Version stamps and cache invalidations only reach workers sharing the cache."""
+    return [
+        Warning(
+            f"The '{alias}' cache is local to each process.",
+            hint="Set CACHE_URL to a shared cache such as Redis when more than one worker serves requests; "
+                 "otherwise writes in one worker leave stale ETags and cached data in the others.",
+            id='BookApp.W001',
+        )
+        for alias, config in settings.CACHES.items()
+        if config.get('BACKEND') in LOCAL_CACHE_BACKENDS
+    ]
@@ -0,0 +1,57 @@
+import functools
+import hashlib
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, versions):
+    """
+    Weak ETag for one rendering of a resource: the request path and query,
+    the negotiated media type, and the version stamps the payload depends on.
+    """
+    parts = [request.get_full_path(), request.accepted_renderer.media_type, *map(str, versions)]
+    return 'W/"%s"' % hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+
+def _matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, so W/ prefixes do not matter.
+    tags = {tag.removeprefix('W/') for tag in parse_etags(header)}
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+
+def conditional_get(versions, public=True):
+    """
+    Wrap an async GET handler so that a request whose If-None-Match still
+    matches is answered with an empty 304 before the handler runs. `versions`
+    is an async callable returning the version stamps the response depends
+    on, given the request.
+
+    Public responses may be kept by shared caches for CATALOG_CACHE_MAX_AGE
+    seconds; private ones are revalidated on every use.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, request, *args, **kwargs):
+            etag = make_etag(request, await versions(request))
+            if _matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = await handler(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response['ETag'] = etag
+            if public:
+                patch_cache_control(response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+                patch_vary_headers(response, ['Accept'])
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ['Accept', 'Authorization'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,278 @@
+import hashlib
+import importlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from .caches import register_stats
+
+
+class LazyResource:
+    """
+    Loads a heavy resource on first use, once per process, and remembers how
+    long that took. Safe to call from several request threads at once.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                self._value = self._loader()
+                self.load_seconds = time.perf_counter() - started
+                self._loaded = True
+        return self._value
+
+
+INFERENCE_MODES = ('fp32', 'int8')
+
+
+def _import(module_name):
+    return lambda: importlib.import_module(module_name)
+
+
+def _load_torch():
+    torch = importlib.import_module('torch')
+    if settings.EMBEDDING_NUM_THREADS:
+        torch.set_num_threads(settings.EMBEDDING_NUM_THREADS)
+    return torch
+
+
+def quantize_model(model):
+    """
+    int8 dynamic quantization: Linear weights are stored as int8 and
+    activations are quantized on the fly, which is where a small BERT spends
+    almost all of its CPU time. Returns a copy; `model` is left untouched.
+    """
+    torch = torch_module.get()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(mode=None):
+    """The embedding model in inference mode `mode` (EMBEDDING_INFERENCE_MODE by default)."""
+    mode = mode or settings.EMBEDDING_INFERENCE_MODE
+    if mode not in INFERENCE_MODES:
+        raise ImproperlyConfigured(f"EMBEDDING_INFERENCE_MODE must be one of {', '.join(INFERENCE_MODES)}, not {mode!r}.")
+    transformers = transformers_module.get()
+    model = transformers.AutoModel.from_pretrained(settings.EMBEDDING_MODEL_NAME)
+    model.eval()
+    if mode == 'int8':
+        model = quantize_model(model)
+    return model
+
+
+def _load_model():
+    return load_model()
+
+
+def _load_tokenizer():
+    transformers = transformers_module.get()
+    return transformers.AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL_NAME)
+
+
+def _load_supabase_client():
+    supabase = supabase_module.get()
+    return supabase.create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+
+torch_module = LazyResource('torch', _load_torch)
+transformers_module = LazyResource('transformers', _import('transformers'))
+supabase_module = LazyResource('supabase', _import('supabase'))
+embedding_model = LazyResource('embedding_model', _load_model)
+embedding_tokenizer = LazyResource('embedding_tokenizer', _load_tokenizer)
+supabase_client = LazyResource('supabase_client', _load_supabase_client)
+
+# In dependency order, so a warm-up report attributes import time to the import.
+RESOURCES = [
+    torch_module,
+    transformers_module,
+    embedding_tokenizer,
+    embedding_model,
+    supabase_module,
+    supabase_client,
+]
+
+
+def get_model():
+    return embedding_model.get()
+
+
+def get_tokenizer():
+    return embedding_tokenizer.get()
+
+
+def get_supabase_client():
+    return supabase_client.get()
+
+
+def warm_up(names=None):
+    """
+    Load the given resources (all of them by default) now instead of on the
+    first request. Meant for serving workers; see WARM_UP_MODELS in settings.
+    """
+    for resource in RESOURCES:
+        if names is None or resource.name in names:
+            resource.get()
+    return startup_report()
+
+
+def startup_report():
+    return [
+        {'name': resource.name, 'loaded': resource.loaded, 'seconds': resource.load_seconds}
+        for resource in RESOURCES
+    ]
+
+
+def mean_pool(last_hidden_state, attention_mask):
+    """Average the token vectors of each row, ignoring padding positions."""
+    mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+    summed = (last_hidden_state * mask).sum(dim=1)
+    counts = mask.sum(dim=1).clamp(min=1e-9)
+    return summed / counts
+
+
+def get_embedding(sentences, model=None, tokenizer=None, max_length=None):
+    torch = torch_module.get()
+    model = model or get_model()
+    tokenizer = tokenizer or get_tokenizer()
+    max_length = max_length or settings.EMBEDDING_MAX_LENGTH
+    inputs = tokenizer(sentences, padding=True, truncation=True, max_length=max_length, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model(**inputs)
+        embeddings = mean_pool(outputs.last_hidden_state, inputs['attention_mask'])
+    return embeddings
+
+
+def model_identity():
+    """Everything that changes the vector a query maps to."""
+    identity = settings.EMBEDDING_MODEL_NAME
+    if settings.EMBEDDING_INFERENCE_MODE != 'fp32':
+        identity += f'#{settings.EMBEDDING_INFERENCE_MODE}'
+    if settings.EMBEDDING_MAX_LENGTH:
+        identity += f'@{settings.EMBEDDING_MAX_LENGTH}'
+    return identity
+
+
+def book_embedding_text(book):
+    return f"{book.title}. {book.summary}"
+
+
+def embedding_fingerprint(text):
+    return hashlib.sha1(f'{model_identity()}\0{text}'.encode()).hexdigest()
+
+
+def normalize_query(text):
+    return ' '.join(str(text).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings with a per-entry TTL, keyed by the
+    normalized query text and the model identity. Vectors are kept as
+    read-only float32 arrays. With `shared=True` misses fall through to the
+    Django cache, so workers reuse each other's forward passes.
+    """
+
+    def __init__(self, max_entries, ttl, shared=False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        digest = hashlib.sha1(f'{model_identity()}\0{normalize_query(text)}'.encode()).hexdigest()
+        return f'bookapp:query-embedding:{digest}'
+
+    def _store(self, key, vector):
+        # Caller holds the lock.
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1].nbytes
+        self._entries[key] = (time.monotonic() + self.ttl, vector)
+        self._bytes += vector.nbytes
+        while len(self._entries) > self.max_entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._bytes -= entry[1].nbytes
+        if self.shared:
+            raw = cache.get(key)
+            if raw is not None:
+                vector = np.frombuffer(raw, dtype=np.float32)
+                with self._lock:
+                    self._store(key, vector)
+                    self.shared_hits += 1
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, text, vector):
+        vector = np.array(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        key = self.key(text)
+        with self._lock:
+            self._store(key, vector)
+        if self.shared:
+            cache.set(key, vector.tobytes(), timeout=self.ttl)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                'bytes': self._bytes,
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+    shared=settings.QUERY_EMBEDDING_CACHE_SHARED,
+)
+
+
+register_stats('embedding_resources', startup_report)
+register_stats('query_embedding_cache', query_embedding_cache.stats)
@@ -0,0 +1,79 @@
+import numpy as np
+from django.core import exceptions
+from django.db import models
+
+
+class VectorField(models.BinaryField):
+    """
+    Vector stored as raw little-endian float32 (or float16, int32, int64)
+    bytes, of exactly `dimensions` values unless dimensions is None.
+
+    Values read from the database come back as read-only NumPy arrays built
+    with np.frombuffer, so loading embeddings creates no per-element Python
+    objects. Lists, tuples and arrays are accepted on assignment.
+    """
+
+    description = "Numeric vector"
+    DTYPES = {'float32': '<f4', 'float16': '<f2', 'int32': '<i4', 'int64': '<i8'}
+
+    def __init__(self, *args, dimensions=None, dtype='float32', **kwargs):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(self.DTYPES)}")
+        self.dimensions = dimensions
+        self.dtype = dtype
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['dimensions'] = self.dimensions
+        if self.dtype != 'float32':
+            kwargs['dtype'] = self.dtype
+        return name, path, args, kwargs
+
+    @property
+    def numpy_dtype(self):
+        return np.dtype(self.DTYPES[self.dtype])
+
+    def decode(self, value):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=self.numpy_dtype)
+
+    def encode(self, value):
+        vector = np.asarray(value, dtype=self.numpy_dtype).reshape(-1)
+        if self.dimensions is not None and vector.shape[0] != self.dimensions:
+            raise ValueError(f"Expected a vector of {self.dimensions} dimensions, got {vector.shape[0]}.")
+        return vector.tobytes()
+
+    def from_db_value(self, value, expression, connection):
+        return self.decode(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return self.decode(value)
+        try:
+            return np.asarray(value, dtype=self.numpy_dtype).reshape(-1)
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError("Enter a list of numbers.", code='invalid')
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            value = self.encode(value)
+        return connection.Database.Binary(value)
+
+    def validate(self, value, model_instance):
+        super().validate(value, model_instance)
+        if value is not None and self.dimensions is not None and np.asarray(value).reshape(-1).shape[0] != self.dimensions:
+            raise exceptions.ValidationError(
+                "Expected a vector of %(dimensions)s dimensions.",
+                code='dimensions',
+                params={'dimensions': self.dimensions},
+            )
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return None if value is None else np.asarray(value, dtype=np.float32).tolist()
@@ -0,0 +1,129 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from django.conf import settings
+from .caches import register_stats
+from .embeddings import get_embedding, normalize_query, query_embedding_cache
+
+
+class EmbeddingQueueFull(Exception):
+    pass
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from concurrent request threads and runs them
+    through the model as one padded batch.
+
+    A background thread takes the first waiting request, keeps gathering for
+    up to `max_wait` seconds or until `max_batch_size` texts are queued, runs a
+    single forward pass and hands every caller its own row. At most
+    `max_queue_depth` requests may wait; beyond that submit() fails fast with
+    EmbeddingQueueFull instead of piling up latency.
+    """
+
+    def __init__(self, embed_batch, max_batch_size=16, max_wait=0.005, max_queue_depth=256):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+
+    def submit_nowait(self, text):
+        """Queue `text` and return a Future that resolves to its vector."""
+        future = Future()
+        try:
+            self._queue.put_nowait((text, future))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise EmbeddingQueueFull("Too many embedding requests are waiting.")
+        self._ensure_worker()
+        return future
+
+    def submit(self, text, timeout=None):
+        return self.submit_nowait(text).result(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = np.asarray(self.embed_batch(texts), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'requests': self.requests,
+                'rejected': self.rejected,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            }
+
+
+def _embed_texts(texts):
+    return get_embedding(texts).numpy()
+
+
+embedding_batcher = EmbeddingBatcher(
+    _embed_texts,
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+    max_queue_depth=settings.EMBEDDING_QUEUE_MAX_DEPTH,
+)
+register_stats('embedding_batcher', embedding_batcher.stats)
+
+
+def embed_query(text):
+    """Embedding of a single search query as a float32 vector, cached and batched."""
+    # Embed the normalized text so every spelling that shares a cache key
+    # also shares the vector.
+    vector = query_embedding_cache.get(text)
+    if vector is None:
+        vector = query_embedding_cache.set(text, embedding_batcher.submit(normalize_query(text)))
+    return vector
+
+
+async def aembed_query(text):
+    """embed_query() for async views: awaits the batch without holding a thread."""
+    vector = query_embedding_cache.get(text)
+    if vector is None:
+        future = embedding_batcher.submit_nowait(normalize_query(text))
+        vector = query_embedding_cache.set(text, await asyncio.wrap_future(future))
+    return vector
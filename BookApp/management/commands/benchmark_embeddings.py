@@ -0,0 +1,75 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from BookApp.embeddings import INFERENCE_MODES, book_embedding_text, get_embedding, get_tokenizer, load_model, quantize_model, torch_module
+from BookApp.models import Book
+
+
+def _percentile(samples, q):
+    return float(np.percentile(samples, q)) * 1000 if samples else 0.0
+
+
+def _embed_all(texts, model, tokenizer, batch_size, max_length):
+    """Embed `texts` in batches; returns the vectors and the seconds each batch took."""
+    vectors = []
+    timings = []
+    for offset in range(0, len(texts), batch_size):
+        started = time.perf_counter()
+        vectors.append(get_embedding(texts[offset:offset + batch_size], model, tokenizer, max_length).numpy())
+        timings.append(time.perf_counter() - started)
+    return np.vstack(vectors), timings
+
+
+def cosine_agreement(vectors, reference):
+    """Row-wise cosine similarity between two equally shaped embedding matrices."""
+    dot = np.einsum('ij,ij->i', vectors, reference)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+    return dot / np.maximum(norms, 1e-12)
+
+
+class Command(BaseCommand):
+    help = "Compare embedding inference modes on book texts: latency, throughput and cosine agreement with fp32."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=INFERENCE_MODES, default=list(INFERENCE_MODES))
+        parser.add_argument('--samples', type=int, default=200, help="Number of books to embed.")
+        parser.add_argument('--batch-size', type=int, default=16, help="Texts per forward pass for the throughput run.")
+        parser.add_argument('--queries', type=int, default=50, help="Single-text passes timed for query latency.")
+        parser.add_argument('--threads', type=int, default=0, help="torch threads (0 keeps the current setting).")
+        parser.add_argument('--max-length', type=int, default=None, help="Truncate inputs to this many tokens.")
+
+    def handle(self, *args, **options):
+        books = Book.objects.only('title', 'summary').order_by('id')[:options['samples']]
+        texts = [book_embedding_text(book) for book in books]
+        if not texts:
+            raise CommandError("There are no books to embed.")
+
+        torch = torch_module.get()
+        if options['threads']:
+            torch.set_num_threads(options['threads'])
+        tokenizer = get_tokenizer()
+        batch_size = options['batch_size']
+        max_length = options['max_length']
+        self.stdout.write(
+            f"{len(texts)} texts, batch size {batch_size}, {torch.get_num_threads()} threads, "
+            f"max length {max_length or tokenizer.model_max_length}"
+        )
+
+        # Every mode is derived from the same fp32 weights, which also give the reference vectors.
+        base = load_model('fp32')
+        reference = None
+        for mode in options['modes']:
+            model = base if mode == 'fp32' else quantize_model(base)
+            get_embedding(texts[:batch_size], model, tokenizer, max_length)  # warm-up
+
+            vectors, batch_timings = _embed_all(texts, model, tokenizer, batch_size, max_length)
+            _, query_timings = _embed_all(texts[:options['queries']], model, tokenizer, 1, max_length)
+            if reference is None:
+                reference = vectors if mode == 'fp32' else _embed_all(texts, base, tokenizer, batch_size, max_length)[0]
+            agreement = cosine_agreement(vectors, reference)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(mode))
+            self.stdout.write(f"  throughput      {len(texts) / sum(batch_timings):10.1f} texts/sec")
+            self.stdout.write(f"  batch latency   p50 {_percentile(batch_timings, 50):8.1f} ms   p95 {_percentile(batch_timings, 95):8.1f} ms")
+            self.stdout.write(f"  query latency   p50 {_percentile(query_timings, 50):8.1f} ms   p95 {_percentile(query_timings, 95):8.1f} ms")
+            self.stdout.write(f"  cosine vs fp32  mean {agreement.mean():.5f}   min {agreement.min():.5f}")
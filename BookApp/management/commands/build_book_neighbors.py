@@ -0,0 +1,31 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from BookApp.neighbors import build_neighbors, update_neighbors
+
+
+class Command(BaseCommand):
+    help = "Build the \"readers also liked\" lists from FavBook, ReadList and Rating, in full or for changed books only."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            help="Only rebuild the books whose interactions changed since the last run.",
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.BOOK_NEIGHBORS_TOP_K,
+            help="Neighbours kept per book.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['delta']:
+            count = update_neighbors(options['top_k'])
+            message = f"Updated the lists of {count} changed books"
+        else:
+            count = build_neighbors(options['top_k'])
+            message = f"Built lists for {count} books"
+        self.stdout.write(self.style.SUCCESS(f"{message} in {time.monotonic() - started:.1f}s."))
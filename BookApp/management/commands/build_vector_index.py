@@ -0,0 +1,62 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from BookApp.models import Book
+from BookApp.vectors import BookVectorIndex, IVFBookVectorIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuild the semantic search index from Book.embedding, save it, and optionally measure IVF recall per nprobe."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.VECTOR_INDEX_PATH, help="Where to save the index (VECTOR_INDEX_PATH by default).")
+        parser.add_argument('--exact', action='store_true', help="Build the exact index even if VECTOR_INDEX is 'ivf'.")
+        parser.add_argument('--nlist', type=int, default=settings.VECTOR_INDEX_NLIST, help="IVF lists (0 for sqrt of the catalog size).")
+        parser.add_argument('--evaluate', type=int, nargs='+', metavar='NPROBE', help="Report recall and latency at these nprobe values.")
+        parser.add_argument('--queries', type=int, default=100, help="Books whose embeddings are used as evaluation queries.")
+        parser.add_argument('--count', type=int, default=10, help="Results per query when measuring recall.")
+
+    def handle(self, *args, **options):
+        exact = options['exact'] or settings.VECTOR_INDEX != 'ivf'
+        if exact:
+            index = BookVectorIndex()
+        else:
+            index = IVFBookVectorIndex(nlist=options['nlist'], nprobe=settings.VECTOR_INDEX_NPROBE)
+
+        started = time.perf_counter()
+        index.sync()
+        stats = index.stats()
+        self.stdout.write(f"Built {'exact' if exact else 'IVF'} index in {time.perf_counter() - started:.1f}s: {stats}")
+        if options['path'] and index.save(options['path']):
+            self.stdout.write(f"Saved to {options['path']}")
+
+        if options['evaluate']:
+            if exact:
+                raise CommandError("--evaluate measures the IVF index; drop --exact and set VECTOR_INDEX='ivf'.")
+            self.evaluate(index, options)
+
+    def evaluate(self, index, options):
+        count = options['count']
+        queries = list(
+            Book.objects.exclude(embedding=None).order_by('?').values_list('embedding', flat=True)[:options['queries']]
+        )
+        if not queries:
+            raise CommandError("There are no embedded books to query with.")
+        reference = BookVectorIndex()
+        expected = [{book_id for book_id, _ in reference.search(query, -1.0, count)} for query in queries]
+
+        for nprobe in options['evaluate']:
+            index.nprobe = nprobe
+            found = 0
+            timings = []
+            for query, relevant in zip(queries, expected):
+                started = time.perf_counter()
+                matches = index.search(query, -1.0, count)
+                timings.append(time.perf_counter() - started)
+                found += len(relevant.intersection(book_id for book_id, _ in matches))
+            recall = found / sum(len(relevant) for relevant in expected)
+            self.stdout.write(
+                f"nprobe {nprobe:>4}  recall@{count} {recall:.3f}  "
+                f"p50 {np.percentile(timings, 50) * 1000:7.2f} ms  p95 {np.percentile(timings, 95) * 1000:7.2f} ms"
+            )
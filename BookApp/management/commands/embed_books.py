@@ -0,0 +1,158 @@
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from django.conf import settings
+from filelock import FileLock, Timeout
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+
+
+SHARD_OPTIONS = ['batch_size', 'chunk_size', 'threads', 'missing_only', 'checkpoint', 'restart']
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_checkpoint(path, shard, last_id, identity):
+    # Several worker processes share the file: re-read it under a lock so their
+    # entries survive, and swap it in whole so a crash never leaves half of it.
+    with FileLock(f'{path}.lock'):
+        data = _load_checkpoint(path)
+        if data.get('model') != identity:
+            data = {'model': identity, 'shards': {}}
+        data['shards'][shard] = last_id
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+
+def embed_shard(worker, workers, options, write=print):
+    """
+    Embed every book of one shard (id % workers == worker) that has no
+    embedding or whose fingerprint no longer matches, batch by batch,
+    checkpointing the last finished id so an interrupted run resumes there.
+    """
+    from BookApp.embeddings import book_embedding_text, embedding_fingerprint, get_embedding, model_identity, torch_module
+    from BookApp.models import Book
+    from BookApp.taste import refresh_books
+    from BookApp.vectors import book_vector_index
+
+    shard = f'{worker}/{workers}'
+    identity = model_identity()
+    checkpoint = options['checkpoint']
+    start_after = 0
+    if not options['restart']:
+        saved = _load_checkpoint(checkpoint)
+        if saved.get('model') == identity:
+            start_after = saved.get('shards', {}).get(shard, 0)
+
+    books = Book.objects.filter(id__gt=start_after).order_by('id')
+    if options['missing_only']:
+        books = books.filter(embedding__isnull=True)
+    if workers > 1:
+        books = books.alias(shard=F('id') % workers).filter(shard=worker)
+
+    pending = []
+    for book in books.only('id', 'title', 'summary', 'embedding_hash').iterator(chunk_size=options['chunk_size']):
+        if book.embedding_hash != embedding_fingerprint(book_embedding_text(book)):
+            pending.append(book.id)
+
+    total = len(pending)
+    write(f"[{shard}] {total} books to embed (resuming after id {start_after})")
+    if not total:
+        return 0
+
+    torch = torch_module.get()
+    if options['threads']:
+        torch.set_num_threads(options['threads'])
+
+    done = 0
+    started = time.monotonic()
+    batch_size = options['batch_size']
+    for offset in range(0, total, batch_size):
+        batch = list(Book.objects.filter(id__in=pending[offset:offset + batch_size]).only('id', 'title', 'summary').order_by('id'))
+        texts = [book_embedding_text(book) for book in batch]
+        with torch.no_grad():
+            vectors = get_embedding(texts).numpy()
+        for book, text, vector in zip(batch, texts, vectors):
+            book.embedding = vector
+            book.embedding_hash = embedding_fingerprint(text)
+        with transaction.atomic():
+            Book.objects.bulk_update(batch, ['embedding', 'embedding_hash'])
+            # bulk_update skips the signals that keep tastes in step with embeddings.
+            refresh_books([book.id for book in batch])
+        book_vector_index.notify_changed([book.id for book in batch])
+        _save_checkpoint(checkpoint, shard, pending[min(offset + batch_size, total) - 1], identity)
+
+        done += len(batch)
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        write(f"[{shard}] {done}/{total} books, {rate:.1f} books/sec, ETA {eta:.0f}s")
+    # Finished: the next run scans the whole shard again for new or edited books.
+    _save_checkpoint(checkpoint, shard, 0, identity)
+    return done
+
+
+def _run_worker(worker, workers, options):
+    import django
+    django.setup()
+    return embed_shard(worker, workers, options)
+
+
+class Command(BaseCommand):
+    help = "Compute Book.embedding for books that have none or whose text/model changed, resuming from a checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=32, help="Books per forward pass and bulk_update.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per round trip while scanning.")
+        parser.add_argument('--workers', type=int, default=1, help="Processes to split the books across (by id).")
+        parser.add_argument('--threads', type=int, default=0, help="torch threads per process (0 keeps torch's default).")
+        parser.add_argument('--missing-only', action='store_true', help="Skip books that already have an embedding.")
+        parser.add_argument(
+            '--checkpoint',
+            default=str(Path(settings.BASE_DIR) / '.embed_books_checkpoint.json'),
+            help="File recording the last finished book id per worker.",
+        )
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and scan from the start.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("--workers must be at least 1")
+
+        options = {key: options[key] for key in SHARD_OPTIONS}
+        # Two runs on one checkpoint would overwrite each other's progress.
+        run_lock = FileLock(f"{options['checkpoint']}.run.lock")
+        try:
+            run_lock.acquire(timeout=0)
+        except Timeout:
+            raise CommandError(f"Another embed_books run is using {options['checkpoint']}.")
+
+        started = time.monotonic()
+        try:
+            if workers == 1:
+                done = embed_shard(0, 1, options, write=self.stdout.write)
+            else:
+                if not options['threads']:
+                    options['threads'] = max(1, (os.cpu_count() or 1) // workers)
+                connections.close_all()
+                # spawn rather than fork: forking after torch has started its thread pools can deadlock.
+                context = multiprocessing.get_context('spawn')
+                with context.Pool(workers) as pool:
+                    done = sum(pool.starmap(_run_worker, [(worker, workers, options) for worker in range(workers)]))
+        finally:
+            run_lock.release()
+
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(f"Embedded {done} books in {elapsed:.1f}s ({rate:.1f} books/sec)."))
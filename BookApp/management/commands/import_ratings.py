@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from BookApp.ratings import CHUNK_SIZE, import_ratings, read_pairs
+
+
+class Command(BaseCommand):
+    help = "Import a user's ratings from a CSV (book_id,rating columns) or JSONL file, upserting them in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for stdin.")
+        parser.add_argument('--user', required=True, help="Username the ratings belong to.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows validated and upserted per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+        path = options['path']
+        format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if format not in ('csv', 'jsonl'):
+            raise CommandError("Pass --format csv or --format jsonl.")
+
+        started = time.monotonic()
+        if path == '-':
+            result = import_ratings(user.id, read_pairs(sys.stdin, format), options['chunk_size'], numbered=True)
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = import_ratings(user.id, read_pairs(stream, format), options['chunk_size'], numbered=True)
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, updated {result['updated']}, left {result['unchanged']} unchanged "
+            f"and skipped {len(result['errors'])} rows in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from BookApp.caches import book_fragments, catalog_stamp
+from BookApp.models import AuthorStats, BookStats
+from BookApp.stats import compute_author_stats, compute_book_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild or reconcile the per-book and per-author counters from the Rating, FavBook and ReadList tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report rows whose counters have drifted, do not write anything.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Rows per bulk_create/bulk_update statement.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            book_stats = compute_book_stats()
+            self.reconcile(BookStats, 'book', book_stats, options)
+            self.reconcile(AuthorStats, 'author', compute_author_stats(book_stats), options)
+            if not options['dry_run']:
+                transaction.on_commit(catalog_stamp.bump)
+                book_fragments.invalidate_all()
+
+    def reconcile(self, model, key, expected, options):
+        fields = [field.name for field in model._meta.concrete_fields if field.name != key]
+        current = {getattr(row, f'{key}_id'): row for row in model.objects.select_for_update()}
+
+        missing = []
+        drifted = []
+        for pk, values in expected.items():
+            row = current.get(pk)
+            if row is None:
+                missing.append(model(**{f'{key}_id': pk}, **values))
+                continue
+            if any(getattr(row, field) != values[field] for field in fields):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{key.capitalize()} {pk}: counters drifted")
+                for field in fields:
+                    setattr(row, field, values[field])
+                drifted.append(row)
+
+        if not options['dry_run']:
+            model.objects.bulk_create(missing, batch_size=options['batch_size'])
+            model.objects.bulk_update(drifted, fields, batch_size=options['batch_size'])
+
+        verb = "Would fix" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(drifted)} drifted and {len(missing)} missing {key} stats rows out of {len(expected)} {key}s."
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from BookApp.models import Book, BookSearchDocument
+from BookApp.search import refresh_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the book search documents (and their tsvectors on PostgreSQL) from Book and Author."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Books per bulk upsert.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+        written = 0
+        with transaction.atomic():
+            BookSearchDocument.objects.exclude(book_id__in=Book.objects.values('id')).delete()
+            for start in range(0, len(book_ids), batch_size):
+                chunk = book_ids[start:start + batch_size]
+                written += refresh_documents(Book.objects.filter(id__in=chunk), batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} books."))
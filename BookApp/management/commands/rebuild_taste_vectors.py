@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from BookApp.taste import store_tastes
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's taste vector from the FavBook, ReadList and Rating tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Users recomputed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        written = 0
+        for offset in range(0, len(user_ids), batch_size):
+            batch = user_ids[offset:offset + batch_size]
+            with transaction.atomic():
+                written += store_tastes(batch)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} taste vectors for {len(user_ids)} users."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from BookApp.embeddings import RESOURCES, warm_up
+
+
+class Command(BaseCommand):
+    help = "Load the embedding model, tokenizer and remote clients and report what each one costs at startup."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            choices=[resource.name for resource in RESOURCES],
+            help="Load only these components (their dependencies load as needed).",
+        )
+
+    def handle(self, *args, **options):
+        report = warm_up(options['only'])
+        total = 0.0
+        for row in report:
+            if row['seconds'] is None:
+                self.stdout.write(f"{row['name']:<22} not loaded")
+                continue
+            total += row['seconds']
+            self.stdout.write(f"{row['name']:<22} {row['seconds'] * 1000:10.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"{'total':<22} {total * 1000:10.1f} ms"))
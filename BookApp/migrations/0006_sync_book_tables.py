@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:54
+
+from django.db import migrations, models
+
+
+# The models have long used these tables, which existing databases already
+# have; only the migration state still pointed at the original names.
+TABLES = {
+    'author': 'BookApp_author_2',
+    'book': 'BookApp_book_2',
+    'category': 'BookApp_category_2',
+    'favbook': 'BookApp_favbook_2',
+}
+
+
+def _rename_tables(apps, schema_editor, forwards):
+    # A database migrated from scratch still has the tables 0001 created under
+    # their default names; rename those, and leave existing tables alone.
+    existing = set(schema_editor.connection.introspection.table_names())
+    for model_name, table in TABLES.items():
+        model = apps.get_model('BookApp', model_name)
+        old, new = (model._meta.db_table, table) if forwards else (table, model._meta.db_table)
+        if old in existing and new not in existing:
+            schema_editor.alter_db_table(model, old, new)
+
+
+def rename_tables(apps, schema_editor):
+    _rename_tables(apps, schema_editor, forwards=True)
+
+
+def restore_tables(apps, schema_editor):
+    _rename_tables(apps, schema_editor, forwards=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0005_remove_author_average_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='book',
+            name='pdf_link',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='embedding',
+            field=models.JSONField(null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterModelTable(name=model_name, table=table)
+                for model_name, table in TABLES.items()
+            ],
+            database_operations=[
+                migrations.RunPython(rename_tables, restore_tables),
+            ],
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_book_stats(apps, schema_editor):
+    Book = apps.get_model('BookApp', 'Book')
+    BookStats = apps.get_model('BookApp', 'BookStats')
+    Rating = apps.get_model('BookApp', 'Rating')
+    FavBook = apps.get_model('BookApp', 'FavBook')
+    ReadList = apps.get_model('BookApp', 'ReadList')
+
+    rows = {book_id: BookStats(book_id=book_id) for book_id in Book.objects.values_list('id', flat=True)}
+    buckets = {f'rating_{i}': Count('id', filter=Q(rating=i)) for i in range(6)}
+    for row in Rating.objects.values('book_id').annotate(rating_sum=Sum('rating'), rating_count=Count('id'), **buckets).order_by():
+        stats = rows[row.pop('book_id')]
+        for field, value in row.items():
+            setattr(stats, field, value or 0)
+    for model, field in ((FavBook, 'favorite_count'), (ReadList, 'readlist_count')):
+        for book_id, total in model.objects.values_list('book_id').annotate(total=Count('id')).order_by():
+            setattr(rows[book_id], field, total)
+    BookStats.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0006_sync_book_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookStats',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='BookApp.book')),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_0', models.IntegerField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('favorite_count', models.IntegerField(default=0)),
+                ('readlist_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-favorite_count'], name='bookstats_fav_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_book_stats, migrations.RunPython.noop),
+    ]
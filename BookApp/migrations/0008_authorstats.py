@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_author_stats(apps, schema_editor):
+    Author = apps.get_model('BookApp', 'Author')
+    AuthorStats = apps.get_model('BookApp', 'AuthorStats')
+    rows = (
+        Author.objects.values('id')
+        .annotate(
+            book_count=Count('book_books', distinct=True),
+            fav_book_count=Sum('book_books__stats__favorite_count'),
+            rating_sum=Sum('book_books__stats__rating_sum'),
+            rating_count=Sum('book_books__stats__rating_count'),
+        )
+        .order_by()
+    )
+    AuthorStats.objects.bulk_create(
+        [
+            AuthorStats(
+                author_id=row['id'],
+                book_count=row['book_count'],
+                fav_book_count=row['fav_book_count'] or 0,
+                rating_sum=row['rating_sum'] or 0,
+                rating_count=row['rating_count'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0007_bookstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='BookApp.author')),
+                ('book_count', models.IntegerField(default=0)),
+                ('fav_book_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-fav_book_count'], name='authorstats_fav_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
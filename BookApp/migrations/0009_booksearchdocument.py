@@ -0,0 +1,67 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:01
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+SEARCH_INDEXES = [
+    ('booksearch_vector_gin', 'search_vector'),
+    ('booksearch_title_trgm', 'title gin_trgm_ops'),
+    ('booksearch_author_trgm', 'author_name gin_trgm_ops'),
+]
+
+
+def backfill_search_documents(apps, schema_editor):
+    Book = apps.get_model('BookApp', 'Book')
+    BookSearchDocument = apps.get_model('BookApp', 'BookSearchDocument')
+    documents = (
+        BookSearchDocument(book_id=book_id, title=title, author_name=author_name, summary=summary)
+        for book_id, title, author_name, summary in Book.objects.values_list('id', 'title', 'author__name', 'summary')
+    )
+    BookSearchDocument.objects.bulk_create(documents, batch_size=500)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'UPDATE "BookApp_booksearchdocument" SET search_vector = '
+            "setweight(to_tsvector(coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector(coalesce(author_name, '')), 'B') || "
+            "setweight(to_tsvector(coalesce(summary, '')), 'C')"
+        )
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes only exist on PostgreSQL; SQLite uses the in-memory index in BookApp/search.py.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "BookApp_booksearchdocument" USING gin ({column})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0008_authorstats'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='BookSearchDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='BookApp.book')),
+                ('title', models.CharField(max_length=255)),
+                ('author_name', models.CharField(max_length=255)),
+                ('summary', models.TextField()),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0009_booksearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='embedding_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:40
+
+import BookApp.fields
+import numpy as np
+from django.db import migrations
+
+DIMENSIONS = 384
+
+
+def json_to_vector(apps, schema_editor):
+    Book = apps.get_model('BookApp', 'Book')
+    batch = []
+    # On a JSONField, embedding=None matches only a stored JSON null; isnull also skips SQL NULL.
+    books = Book.objects.filter(embedding__isnull=False).exclude(embedding=None)
+    for book in books.only('id', 'embedding').iterator(chunk_size=500):
+        vector = np.asarray(book.embedding, dtype='<f4').reshape(-1)
+        # Embeddings of the wrong size cannot be searched; drop them so embed_books recomputes them.
+        book.embedding_vector = vector.tobytes() if vector.shape[0] == DIMENSIONS else None
+        if book.embedding_vector is None:
+            book.embedding_hash = None
+        batch.append(book)
+        if len(batch) == 500:
+            Book.objects.bulk_update(batch, ['embedding_vector', 'embedding_hash'])
+            batch = []
+    Book.objects.bulk_update(batch, ['embedding_vector', 'embedding_hash'])
+
+
+def vector_to_json(apps, schema_editor):
+    Book = apps.get_model('BookApp', 'Book')
+    batch = []
+    for book in Book.objects.filter(embedding_vector__isnull=False).only('id', 'embedding_vector').iterator(chunk_size=500):
+        book.embedding = np.asarray(book.embedding_vector, dtype=np.float32).tolist()
+        batch.append(book)
+        if len(batch) == 500:
+            Book.objects.bulk_update(batch, ['embedding'])
+            batch = []
+    Book.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0010_book_embedding_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='embedding_vector',
+            field=BookApp.fields.VectorField(dimensions=DIMENSIONS, null=True),
+        ),
+        migrations.RunPython(json_to_vector, vector_to_json),
+    ]
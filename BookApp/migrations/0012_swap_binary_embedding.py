@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Separate from 0011 so the column swap does not share a transaction with the data copy.
+
+    dependencies = [
+        ('BookApp', '0011_binary_embedding'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='book',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='book',
+            old_name='embedding_vector',
+            new_name='embedding',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:13
+
+import BookApp.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0012_swap_binary_embedding'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTaste',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='taste', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('vector_sum', BookApp.fields.VectorField(dimensions=384, null=True)),
+                ('weight', models.FloatField(default=0)),
+            ],
+        ),
+    ]
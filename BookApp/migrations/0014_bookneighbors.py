@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:16
+
+import BookApp.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0013_usertaste'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbors',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbors', serialize=False, to='BookApp.book')),
+                ('neighbor_ids', BookApp.fields.VectorField(default=bytes, dimensions=None, dtype='int64')),
+                ('scores', BookApp.fields.VectorField(default=bytes, dimensions=None)),
+                ('norm', models.FloatField(default=0)),
+                ('dirty', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('dirty', True)), fields=['book'], name='bookneighbors_dirty_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0014_bookneighbors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usercomment',
+            index=models.Index(fields=['book', 'date', 'id'], name='usercomment_book_date_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-17 21:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_titles(apps, schema_editor):
+    Book = apps.get_model('BookApp', 'Book')
+    BookStats = apps.get_model('BookApp', 'BookStats')
+    BookStats.objects.update(title=Subquery(Book.objects.filter(id=OuterRef('book_id')).values('title')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0015_usercomment_book_date_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookstats',
+            name='bookstats_fav_idx',
+        ),
+        migrations.AddField(
+            model_name='bookstats',
+            name='title',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RunPython(copy_titles, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bookstats',
+            index=models.Index(fields=['-favorite_count', 'title', 'book'], name='bookstats_catalog_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-17 21:07
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_names(apps, schema_editor):
+    Author = apps.get_model('BookApp', 'Author')
+    AuthorStats = apps.get_model('BookApp', 'AuthorStats')
+    AuthorStats.objects.update(name=Subquery(Author.objects.filter(id=OuterRef('author_id')).values('name')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BookApp', '0016_bookstats_title'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='authorstats',
+            name='authorstats_fav_idx',
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='name',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RunPython(copy_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(fields=['-fav_book_count', 'name', 'author'], name='authorstats_leaderboard_idx'),
+        ),
+    ]
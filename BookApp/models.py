@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.conf import settings
+from .fields import VectorField
 
 
 
@@ -26,7 +29,9 @@ class Book(models.Model):
     cover = models.CharField(max_length=455, null=True, blank=True)
     category = models.ForeignKey(Category,related_name='book_category', on_delete=models.CASCADE)
     page_count = models.IntegerField()
-    embedding = models.JSONField(null=True)
+    embedding = VectorField(dimensions=settings.EMBEDDING_DIMENSIONS, null=True)
+    # Fingerprint of the model and text the embedding was computed from; see embed_books.
+    embedding_hash = models.CharField(max_length=40, null=True, blank=True)
 
     def __str__(self):
         return self.title
@@ -57,6 +62,10 @@ class UserComment(models.Model):
     content = models.TextField()
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Serves a book's comment feed, newest first or since a cursor, by index range scan.
+        indexes = [models.Index(fields=['book', 'date', 'id'], name='usercomment_book_date_idx')]
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.book.title}"
 
@@ -68,3 +77,92 @@ class Rating(models.Model):
 
     class Meta:
         unique_together = ('user', 'book')
+
+
+class BookStats(models.Model):
+    book = models.OneToOneField(Book, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_0 = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    favorite_count = models.IntegerField(default=0)
+    readlist_count = models.IntegerField(default=0)
+    # Copy of Book.title, so the catalog order (-favorite_count, title, book)
+    # is served by one index on this table; kept in step by signals.py.
+    title = models.CharField(max_length=255, default='')
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0
+        return self.rating_sum / self.rating_count
+
+    @property
+    def rating_histogram(self):
+        return [getattr(self, f'rating_{i}') for i in range(6)]
+
+    class Meta:
+        indexes = [models.Index(fields=['-favorite_count', 'title', 'book'], name='bookstats_catalog_idx')]
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(Author, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    book_count = models.IntegerField(default=0)
+    fav_book_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    # Copy of Author.name, so the leaderboard order (-fav_book_count, name,
+    # author) is served by one index on this table; kept in step by signals.py.
+    name = models.CharField(max_length=255, default='')
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    class Meta:
+        indexes = [models.Index(fields=['-fav_book_count', 'name', 'author'], name='authorstats_leaderboard_idx')]
+
+
+class BookSearchDocument(models.Model):
+    book = models.OneToOneField(Book, related_name='search_document', on_delete=models.CASCADE, primary_key=True)
+    title = models.CharField(max_length=255)
+    author_name = models.CharField(max_length=255)
+    summary = models.TextField()
+    # Only maintained on PostgreSQL; the GIN indexes are created by migration 0009.
+    search_vector = SearchVectorField(null=True)
+
+
+class UserTaste(models.Model):
+    """
+    A user's taste: the weighted sum of the unit embeddings of the books they
+    favorited, put on their readlist or rated highly (see taste.py).
+    """
+    user = models.OneToOneField(User, related_name='taste', on_delete=models.CASCADE, primary_key=True)
+    vector_sum = VectorField(dimensions=settings.EMBEDDING_DIMENSIONS, null=True)
+    weight = models.FloatField(default=0)
+
+
+class BookNeighbors(models.Model):
+    """
+    "Readers also liked" list of a book: the ids of its top-K co-engaged books
+    and their similarities, most similar first, stored as packed arrays so a
+    lookup is one primary-key read (see neighbors.py).
+    """
+    book = models.OneToOneField(Book, related_name='neighbors', on_delete=models.CASCADE, primary_key=True)
+    neighbor_ids = VectorField(dtype='int64', default=bytes)
+    scores = VectorField(dtype='float32', default=bytes)
+    # Squared norm of the book's column in the user-book interaction matrix.
+    norm = models.FloatField(default=0)
+    # Set when one of the book's interactions changed since the list was built.
+    dirty = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['book'], condition=models.Q(dirty=True), name='bookneighbors_dirty_idx'),
+        ]
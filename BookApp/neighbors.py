@@ -0,0 +1,233 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .models import BookNeighbors, FavBook, Rating, ReadList
+from .taste import interaction_weights
+
+# Upper bound on the (book, book) pairs materialized at once while counting.
+MAX_PAIRS_PER_CHUNK = 5_000_000
+EMPTY_LIST = (np.empty(0, np.int64), np.empty(0, np.float32))
+
+
+def mark_dirty(book_ids):
+    """
+    Flag books whose interactions changed so the next delta update rebuilds
+    their lists. Call inside the same transaction as the write being recorded.
+    """
+    book_ids = list(book_ids)
+    flagged = set(BookNeighbors.objects.filter(book_id__in=book_ids).values_list('book_id', flat=True))
+    BookNeighbors.objects.filter(book_id__in=flagged, dirty=False).update(dirty=True)
+    BookNeighbors.objects.bulk_create(
+        [BookNeighbors(book_id=book_id, dirty=True) for book_id in book_ids if book_id not in flagged],
+        ignore_conflicts=True,
+    )
+
+
+def record_interaction(book_id):
+    mark_dirty([book_id])
+
+
+def discard_user(user_id):
+    """A user is about to be deleted; their books' lists lose a reader."""
+    books = set(FavBook.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    books.update(ReadList.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    books.update(Rating.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    mark_dirty(books)
+
+
+def _interactions(**filters):
+    """
+    Parallel (user_ids, book_ids, weights) arrays of the interactions matching
+    `filters`, grouped by user, without users above BOOK_NEIGHBORS_MAX_USER_BOOKS.
+    """
+    weights = interaction_weights(**filters)
+    pairs = np.array(list(weights), dtype=np.int64).reshape(-1, 2)
+    values = np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+    order = np.argsort(pairs[:, 0], kind='stable')
+    users, books, values = pairs[order, 0], pairs[order, 1], values[order]
+    _, inverse, counts = np.unique(users, return_inverse=True, return_counts=True)
+    keep = counts[inverse] <= settings.BOOK_NEIGHBORS_MAX_USER_BOOKS
+    return users[keep], books[keep], values[keep]
+
+
+def cooccurrence(users, books, weights, sources=None):
+    """
+    Co-engagement of every pair of distinct books read by a common user:
+    sum over users of w(user, a) * w(user, b). Interactions must be grouped
+    by user. With `sources`, only pairs whose first book is in it are counted.
+    Returns parallel (a, b, value) arrays, each unordered pair in both orders.
+    """
+    if not len(users):
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    book_ids, dense = np.unique(books, return_inverse=True)
+    wanted = None if sources is None else np.isin(book_ids, sources)
+
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    sizes = np.diff(np.r_[starts, len(users)])
+    # Split the users into chunks of at most MAX_PAIRS_PER_CHUNK candidate pairs.
+    chunk_of = np.cumsum(sizes.astype(np.int64) ** 2) // MAX_PAIRS_PER_CHUNK
+    keys, values = [], []
+    for chunk in np.unique(chunk_of):
+        groups = np.flatnonzero(chunk_of == chunk)
+        row_size = np.repeat(sizes[groups], sizes[groups])
+        row_start = np.repeat(starts[groups], sizes[groups])
+        rows = row_start + np.arange(len(row_size)) - np.repeat(np.cumsum(sizes[groups]) - sizes[groups], sizes[groups])
+        left = np.repeat(rows, row_size)
+        right = np.repeat(row_start, row_size) + (
+            np.arange(len(left)) - np.repeat(np.cumsum(row_size) - row_size, row_size)
+        )
+        keep = left != right
+        if wanted is not None:
+            keep &= wanted[dense[left]]
+        left, right = left[keep], right[keep]
+        keys.append(dense[left] * len(book_ids) + dense[right])
+        values.append(weights[left] * weights[right])
+
+    unique, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    sums = np.bincount(inverse, weights=np.concatenate(values))
+    return book_ids[unique // len(book_ids)], book_ids[unique % len(book_ids)], sums
+
+
+def squared_norms(books, weights):
+    """{book_id: sum of squared interaction weights} over the given interactions."""
+    book_ids, dense = np.unique(books, return_inverse=True)
+    return dict(zip(book_ids.tolist(), np.bincount(dense, weights=weights ** 2).tolist()))
+
+
+def top_neighbors(left, right, scores, top_k):
+    """{book_id: (neighbor_ids, scores)} keeping the top_k highest positive scores per book."""
+    keep = scores > 0
+    left, right, scores = left[keep], right[keep], scores[keep]
+    order = np.lexsort((-scores, left))
+    left, right, scores = left[order], right[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+    ends = np.r_[starts[1:], len(left)]
+    return {
+        int(left[start]): (right[start:min(end, start + top_k)], scores[start:min(end, start + top_k)].astype(np.float32))
+        for start, end in zip(starts, ends)
+    }
+
+
+def cosine(left, right, values, norms):
+    """Co-engagement values divided by the norms of both books; 0 where a norm is unknown."""
+    if not norms or not len(values):
+        return np.zeros_like(values)
+    ids = np.array(sorted(norms), dtype=np.int64)
+    squared = np.array([norms[book_id] for book_id in ids.tolist()])
+
+    def lookup(book_ids):
+        at = np.minimum(np.searchsorted(ids, book_ids), len(ids) - 1)
+        return np.where(ids[at] == book_ids, squared[at], 0.0)
+
+    divisor = np.sqrt(lookup(left) * lookup(right))
+    return np.divide(values, divisor, out=np.zeros_like(values), where=divisor > 0)
+
+
+def build_neighbors(top_k=None):
+    """
+    Rebuild every book's list from the FavBook, ReadList and Rating tables.
+    Returns the number of lists written.
+    """
+    top_k = top_k or settings.BOOK_NEIGHBORS_TOP_K
+    users, books, weights = _interactions()
+    norms = squared_norms(books, weights)
+    left, right, values = cooccurrence(users, books, weights)
+    lists = top_neighbors(left, right, cosine(left, right, values, norms), top_k)
+
+    rows = []
+    for book_id, norm in norms.items():
+        ids, scores = lists.get(book_id, EMPTY_LIST)
+        rows.append(BookNeighbors(book_id=book_id, neighbor_ids=ids, scores=scores, norm=norm, dirty=False))
+    with transaction.atomic():
+        BookNeighbors.objects.exclude(book_id__in=list(norms)).delete()
+        BookNeighbors.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['book'],
+            update_fields=['neighbor_ids', 'scores', 'norm', 'dirty'],
+        )
+    return len(rows)
+
+
+def _merge(row, updates, removed, top_k):
+    # Scores in `updates` replace the row's own; ids in `removed` are dropped.
+    entries = {
+        neighbor_id: score
+        for neighbor_id, score in zip(row.neighbor_ids.tolist(), row.scores.tolist())
+        if neighbor_id not in removed
+    }
+    entries.update(updates)
+    best = sorted(entries.items(), key=lambda item: -item[1])[:top_k]
+    row.neighbor_ids = np.array([neighbor_id for neighbor_id, _ in best], dtype=np.int64)
+    row.scores = np.array([score for _, score in best], dtype=np.float32)
+
+
+def update_neighbors(top_k=None):
+    """
+    Rebuild the lists of the books flagged by mark_dirty() and fold their new
+    scores into the lists of their neighbours. Returns the number of books
+    that were flagged.
+
+    Each flagged book's list is recomputed exactly, from every interaction of
+    every user who engaged with it. Its neighbours' lists are patched in place:
+    a book whose score dropped out of a neighbour's top_k leaves room that is
+    only refilled by the next full build_neighbors().
+    """
+    top_k = top_k or settings.BOOK_NEIGHBORS_TOP_K
+    with transaction.atomic():
+        flagged = {row.book_id: row for row in BookNeighbors.objects.select_for_update().filter(dirty=True)}
+        if not flagged:
+            return 0
+        readers = {user_id for user_id, _ in interaction_weights(book_id__in=list(flagged))}
+        users, books, weights = _interactions(user_id__in=readers)
+
+        norms = dict(BookNeighbors.objects.filter(book_id__in=set(books.tolist())).values_list('book_id', 'norm'))
+        # Every reader of a flagged book is in `users`, so these norms are exact.
+        fresh = squared_norms(books, weights)
+        norms.update({book_id: fresh.get(book_id, 0.0) for book_id in flagged})
+        left, right, values = cooccurrence(users, books, weights, sources=list(flagged))
+        scores = cosine(left, right, values, norms)
+        lists = top_neighbors(left, right, scores, top_k)
+
+        # Scores are symmetric: tell each unflagged neighbour its new score
+        # with the flagged book, and drop flagged books it no longer shares a reader with.
+        updates = {}
+        for a, b, score in zip(left.tolist(), right.tolist(), scores.tolist()):
+            if b not in flagged:
+                updates.setdefault(b, {})[a] = score
+        removed = {}
+        for book_id, row in flagged.items():
+            current = set(lists[book_id][0].tolist()) if book_id in lists else set()
+            for neighbor_id in row.neighbor_ids.tolist():
+                if neighbor_id not in flagged and neighbor_id not in current:
+                    removed.setdefault(neighbor_id, set()).add(book_id)
+
+        neighbors = BookNeighbors.objects.select_for_update().filter(book_id__in=set(updates) | set(removed))
+        patched = []
+        for row in neighbors:
+            _merge(row, updates.get(row.book_id, {}), removed.get(row.book_id, set()), top_k)
+            patched.append(row)
+        for book_id, row in flagged.items():
+            row.neighbor_ids, row.scores = lists.get(book_id, EMPTY_LIST)
+            row.norm = norms[book_id]
+            row.dirty = False
+        BookNeighbors.objects.bulk_update(patched + list(flagged.values()), ['neighbor_ids', 'scores', 'norm', 'dirty'], batch_size=500)
+    return len(flagged)
+
+
+def _neighbor_list(row, limit):
+    if row is None:
+        return []
+    ids, scores = row
+    return list(zip(ids.tolist(), scores.tolist()))[:limit]
+
+
+def readers_also_liked(book_id, limit=None):
+    """(book_id, score) pairs from the stored list of `book_id`, best first."""
+    return _neighbor_list(BookNeighbors.objects.filter(book_id=book_id).values_list('neighbor_ids', 'scores').first(), limit)
+
+
+async def areaders_also_liked(book_id, limit=None):
+    row = await BookNeighbors.objects.filter(book_id=book_id).values_list('neighbor_ids', 'scores').afirst()
+    return _neighbor_list(row, limit)
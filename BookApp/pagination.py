@@ -0,0 +1,117 @@
+import base64
+import datetime
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    # Keep full microsecond precision; DjangoJSONEncoder truncates to milliseconds,
+    # which would make the cursor skip or repeat rows sharing a timestamp.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_encode_value, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """
+    The key carried by `cursor`, each value converted by the matching model
+    field in `fields`. Raises InvalidCursor for anything else, so a tampered
+    cursor is a client error rather than a failing query.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(fields) or None in values:
+        raise InvalidCursor("Invalid cursor")
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed, unique ordering such as ['-favorite_count', 'title', 'id'].
+    The cursor carries the sort key of the last row of a page, and the next page is
+    fetched with a row-comparison WHERE clause, so deep pages cost the same as the
+    first one. One extra row is read to tell whether there is a next page, instead
+    of running COUNT(*). `cursor_param` names the query parameter the cursor
+    is read from.
+    """
+
+    def __init__(self, ordering, default_limit=20, max_limit=100, cursor_param='cursor'):
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.cursor_param = cursor_param
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except (TypeError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def after(self, values):
+        """Q object matching rows that sort strictly after the given key."""
+        condition = Q()
+        equal = {}
+        for field, name, value in zip(self.ordering, self.fields, values):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def key_for(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name in self.fields]
+        return [getattr(row, name) for name in self.fields]
+
+    def key_fields(self, queryset):
+        """The model field behind each ordering name, annotations included."""
+        annotations = queryset.query.annotations
+        return [
+            annotations[name].output_field if name in annotations else queryset.model._meta.get_field(name)
+            for name in self.fields
+        ]
+
+    def _page(self, queryset, request):
+        limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_param)
+        if cursor:
+            queryset = queryset.filter(self.after(decode_cursor(cursor, self.key_fields(queryset))))
+        return queryset[:limit + 1], limit
+
+    def split_page(self, rows, limit):
+        """
+        Split `limit + 1` rows read in this ordering into the page and the
+        cursor of the next one (None when there is no extra row).
+        """
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(self.key_for(rows[-1]))
+
+    def paginate(self, queryset, request):
+        """Return (rows, next_cursor); next_cursor is None on the last page."""
+        page, limit = self._page(queryset, request)
+        return self.split_page(list(page), limit)
+
+    async def apaginate(self, queryset, request):
+        """Async paginate(), reading the page through the async ORM."""
+        page, limit = self._page(queryset, request)
+        return self.split_page([row async for row in page], limit)
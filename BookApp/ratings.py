@@ -0,0 +1,155 @@
+import csv
+import json
+from itertools import islice
+import numpy as np
+from django.db import transaction
+from . import neighbors, stats, taste
+from .models import Book, Rating
+
+CHUNK_SIZE = 1000
+MIN_RATING, MAX_RATING = 0, 5
+
+
+def _numbers(values):
+    """Float array of `values`, NaN wherever a value is not a number."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    numbers = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        try:
+            numbers[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return numbers
+
+
+def validate(raw_book_ids, raw_ratings):
+    """
+    Check a chunk of (book_id, rating) values in one pass over arrays and
+    one query for the books that exist. Returns (rows, book_ids, ratings,
+    errors): the positions of the rows to write, their book ids and stored
+    ratings, and {position: message} for the rest. When a book appears more
+    than once, the last row wins.
+    """
+    book_ids = _numbers(raw_book_ids)
+    ratings = _numbers(raw_ratings)
+    errors = {}
+
+    def reject(mask, message):
+        for row in np.flatnonzero(mask & ~rejected):
+            errors[int(row)] = message
+        rejected[mask] = True
+
+    rejected = np.zeros(len(book_ids), dtype=bool)
+    finite = np.isfinite(book_ids)
+    reject(
+        ~finite | (book_ids < 1) | (book_ids >= 2 ** 63) | (np.floor(book_ids) != book_ids),
+        "book_id must be a positive integer",
+    )
+    reject(~np.isfinite(ratings) | (ratings < MIN_RATING) | (ratings > MAX_RATING), f"rating must be between {MIN_RATING} and {MAX_RATING}")
+
+    book_ids = np.where(rejected, 0, book_ids).astype(np.int64)
+    candidates = np.unique(book_ids[~rejected]).tolist()
+    existing = np.fromiter(Book.objects.filter(id__in=candidates).values_list('id', flat=True), dtype=np.int64)
+    reject(~np.isin(book_ids, existing), "Book not found")
+
+    rows = np.flatnonzero(~rejected)
+    # np.unique keeps the first occurrence, so look from the end for the last one.
+    _, last = np.unique(book_ids[rows][::-1], return_index=True)
+    keep = np.zeros(len(rows), dtype=bool)
+    keep[len(rows) - 1 - last] = True
+    reject(np.isin(np.arange(len(book_ids)), rows[~keep]), "Duplicate book_id; a later row replaces it")
+
+    rows = np.flatnonzero(~rejected)
+    # Rating.rating is an IntegerField; store what stats._stored_rating counts.
+    return rows, book_ids[rows], ratings[rows].astype(np.int64), errors
+
+
+def _write(user_id, book_ids, ratings):
+    """Upsert one validated chunk and keep the counters in step. Returns (created, updated)."""
+    with transaction.atomic():
+        old = dict(
+            Rating.objects.select_for_update()
+            .filter(user_id=user_id, book_id__in=book_ids)
+            .values_list('book_id', 'rating')
+        )
+        changed = [(book_id, rating) for book_id, rating in zip(book_ids, ratings) if old.get(book_id) != rating]
+        if not changed:
+            return 0, 0
+        Rating.objects.bulk_create(
+            [Rating(user_id=user_id, book_id=book_id, rating=rating) for book_id, rating in changed],
+            update_conflicts=True,
+            unique_fields=['user', 'book'],
+            update_fields=['rating'],
+        )
+        stats.record_ratings((book_id, old.get(book_id), rating) for book_id, rating in changed)
+        taste.record_ratings(user_id, [(book_id, old.get(book_id), rating) for book_id, rating in changed])
+        taste.recommendation_cache.invalidate(user_id)
+        neighbors.mark_dirty(book_id for book_id, _ in changed)
+    created = sum(book_id not in old for book_id, _ in changed)
+    return created, len(changed) - created
+
+
+def import_ratings(user_id, pairs, chunk_size=CHUNK_SIZE, numbered=False):
+    """
+    Upsert a user's ratings from an iterable of (book_id, rating) pairs,
+    one transaction and one INSERT ... ON CONFLICT per chunk of `chunk_size`.
+    Pairs may hold strings; invalid rows are skipped and reported.
+
+    Returns {'created', 'updated', 'unchanged', 'errors'}, where errors is a
+    list of {'row', 'error'} with `row` the 0-based position in `pairs`, or,
+    with `numbered`, the number each pair arrived with as (row, pair).
+    """
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+    pairs = iter(pairs)
+    offset = 0
+    while chunk := list(islice(pairs, chunk_size)):
+        if numbered:
+            numbers, chunk = zip(*chunk)
+        else:
+            numbers = range(offset, offset + len(chunk))
+        raw_book_ids = [pair[0] if pair is not None else None for pair in chunk]
+        raw_ratings = [pair[1] if pair is not None else None for pair in chunk]
+        rows, book_ids, ratings, errors = validate(raw_book_ids, raw_ratings)
+        created, updated = _write(user_id, book_ids.tolist(), ratings.tolist())
+        result['created'] += created
+        result['updated'] += updated
+        result['unchanged'] += len(rows) - created - updated
+        result['errors'].extend({'row': numbers[row], 'error': message} for row, message in sorted(errors.items()))
+        offset += len(chunk)
+    return result
+
+
+def read_pairs(stream, format):
+    """
+    Stream (line_number, pair) out of a text file: 'csv' with book_id and
+    rating columns, or 'jsonl' with one {"book_id": ..., "rating": ...} per
+    line. Line numbers are 1-based file lines, so the CSV header is line 1;
+    blank JSONL lines are skipped and unreadable ones pair with None.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, (row.get('book_id'), row.get('rating'))
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            yield line_number, (row.get('book_id'), row.get('rating'))
+        except (ValueError, AttributeError):
+            yield line_number, None
+
+
+def parse_pairs(data):
+    """(book_id, rating) pairs from a request body: objects or [book_id, rating] lists."""
+    for item in data:
+        if isinstance(item, dict):
+            yield item.get('book_id'), item.get('rating')
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            yield tuple(item)
+        else:
+            yield None
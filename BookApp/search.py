@@ -0,0 +1,165 @@
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from .caches import VersionStamp
+from .models import BookSearchDocument
+
+SEARCH_VECTOR = (
+    SearchVector('title', weight='A')
+    + SearchVector('author_name', weight='B')
+    + SearchVector('summary', weight='C')
+)
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of a term hit per document field in the in-memory index,
+# mirroring the A/B/C weights of the PostgreSQL vector.
+FIELD_WEIGHTS = {'title': 3.0, 'author_name': 2.0, 'summary': 1.0}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold())
+
+
+def refresh_documents(books, batch_size=500):
+    """
+    Rewrite the search documents of the given Book queryset.
+    Called from the Book/Author signals and by `manage.py rebuild_search_index`.
+    """
+    books = books.select_related('author').only('id', 'title', 'summary', 'author__name').order_by('id')
+    documents = [
+        BookSearchDocument(book_id=book.id, title=book.title, author_name=book.author.name, summary=book.summary)
+        for book in books.iterator(chunk_size=batch_size)
+    ]
+    if not documents:
+        return 0
+    BookSearchDocument.objects.bulk_create(
+        documents,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['book'],
+        update_fields=['title', 'author_name', 'summary'],
+    )
+    if connection.vendor == 'postgresql':
+        for start in range(0, len(documents), batch_size):
+            book_ids = [document.book_id for document in documents[start:start + batch_size]]
+            BookSearchDocument.objects.filter(book_id__in=book_ids).update(search_vector=SEARCH_VECTOR)
+    transaction.on_commit(get_backend().invalidate)
+    return len(documents)
+
+
+class PostgresSearchBackend:
+    """
+    Ranked full-text search on the weighted tsvector, with trigram word
+    similarity on title and author name so partial words and typos still match.
+    Both are served by the GIN indexes created in migration 0009.
+    """
+
+    def search(self, queryset, keyword):
+        query = SearchQuery(keyword, search_type='websearch')
+        rank = (
+            SearchRank(F('search_document__search_vector'), query)
+            + TrigramWordSimilarity(keyword, 'search_document__title')
+            + TrigramWordSimilarity(keyword, 'search_document__author_name')
+        )
+        return queryset.filter(
+            Q(search_document__search_vector=query)
+            | Q(search_document__title__trigram_word_similar=keyword)
+            | Q(search_document__author_name__trigram_word_similar=keyword)
+        ).annotate(search_rank=rank)
+
+    def invalidate(self):
+        pass
+
+
+class InvertedIndexBackend:
+    """
+    Pure-Python inverted index over BookSearchDocument, used on SQLite (tests and
+    local development). Query terms match indexed terms by prefix, every term has
+    to match, and hits are scored by field weight and inverse document frequency.
+    The index is rebuilt lazily when its version stamp moves.
+    """
+
+    def __init__(self):
+        self.stamp = VersionStamp('bookapp:search-index:version')
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._terms = []
+        self._size = 0
+
+    def invalidate(self):
+        self.stamp.bump()
+
+    def _load(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        size = 0
+        for document in BookSearchDocument.objects.values('book_id', *FIELD_WEIGHTS).iterator():
+            size += 1
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(document[field]):
+                    postings[term][document['book_id']] += weight
+        return {term: dict(books) for term, books in postings.items()}, size
+
+    def _fresh(self):
+        version = self.stamp.current()
+        with self._lock:
+            if self._version == version:
+                return self._postings, self._terms, self._size
+        postings, size = self._load()
+        terms = sorted(postings)
+        with self._lock:
+            self._version, self._postings, self._terms, self._size = version, postings, terms, size
+        return postings, terms, size
+
+    def scores(self, keyword):
+        postings, terms, size = self._fresh()
+        result = None
+        for token in set(tokenize(keyword)):
+            matched = defaultdict(float)
+            start = bisect.bisect_left(terms, token)
+            for term in terms[start:]:
+                if not term.startswith(token):
+                    break
+                books = postings[term]
+                idf = math.log(1 + size / len(books))
+                exact = 1.0 if term == token else 0.5
+                for book_id, weight in books.items():
+                    matched[book_id] += weight * idf * exact
+            if result is None:
+                result = matched
+            else:
+                result = {book_id: score + matched[book_id] for book_id, score in result.items() if book_id in matched}
+            if not result:
+                return {}
+        return result or {}
+
+    def search(self, queryset, keyword):
+        scores = self.scores(keyword)
+        if not scores:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        rank = Case(
+            *[When(id=book_id, then=Value(score)) for book_id, score in scores.items()],
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=list(scores)).annotate(search_rank=rank)
+
+
+_backends = {}
+
+
+def get_backend():
+    vendor = 'postgresql' if connection.vendor == 'postgresql' else 'inverted_index'
+    if vendor not in _backends:
+        _backends[vendor] = PostgresSearchBackend() if vendor == 'postgresql' else InvertedIndexBackend()
+    return _backends[vendor]
+
+
+def search_books(queryset, keyword):
+    """Filter a Book queryset to matches for `keyword`, annotated with `search_rank`."""
+    return get_backend().search(queryset, keyword)
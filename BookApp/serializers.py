@@ -1,7 +1,6 @@
 from .models import Author,Book,FavBook,Rating,UserComment,ReadList,Category
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from django.db.models import Avg
 
 class BookforAuthorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -41,10 +40,11 @@ class ReadBooksSerializer(serializers.ModelSerializer):
         fields=['id','book']
         
 class UserSerializer(serializers.ModelSerializer):
-    comment_user=CommentsforUser(many=True,read_only=True)
-    fav_user=FavBookSerializer(many=True, read_only=True)
-    read_user=ReadBooksSerializer(many=True, read_only=True)
-    rating_user=RatingforUser(many=True,read_only=True)
+    # The collections are the capped first pages ProfileView prefetches.
+    comment_user=CommentsforUser(many=True,read_only=True,source='comment_user_page')
+    fav_user=FavBookSerializer(many=True, read_only=True,source='fav_user_page')
+    read_user=ReadBooksSerializer(many=True, read_only=True,source='read_user_page')
+    rating_user=RatingforUser(many=True,read_only=True,source='rating_user_page')
     class Meta:
         model=User
         fields = ['id','username','email','is_superuser','date_joined','fav_user','read_user','comment_user','rating_user']
@@ -70,8 +70,9 @@ class BookSerializer(serializers.ModelSerializer):
         fields=['id','title','cover','author','summary','category','page_count','average_rating']
     
     def get_average_rating(self, obj):
-        average_rating = Rating.objects.filter(book=obj).aggregate(Avg('rating'))['rating__avg']
-        return average_rating if average_rating is not None else 0 
+        # Reads the denormalized counters; select_related('stats') keeps this query-free.
+        book_stats = getattr(obj, 'stats', None)
+        return book_stats.average_rating if book_stats is not None else 0
 
 class BasicUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,112 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import Author, AuthorStats, Book, BookStats, Category, UserComment
+from .caches import book_fragments, catalog_stamp, category_catalog, comment_stamp
+from .search import get_backend as get_search_backend, refresh_documents
+from .vectors import book_vector_index
+from . import neighbors, stats, taste
+
+
+@receiver(post_save, sender=Author)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(author=instance, defaults={'name': instance.name})
+    else:
+        AuthorStats.objects.filter(author=instance).exclude(name=instance.name).update(name=instance.name)
+        # The author name is part of every one of their books' search documents.
+        refresh_documents(Book.objects.filter(author=instance))
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_author(sender, instance, **kwargs):
+    instance._previous_author_id = instance._previous_embedding_hash = instance._previous_title = None
+    if instance.pk is not None:
+        previous = Book.objects.filter(pk=instance.pk).values_list('author_id', 'embedding_hash', 'title').first()
+        if previous is not None:
+            instance._previous_author_id, instance._previous_embedding_hash, instance._previous_title = previous
+
+
+@receiver(post_save, sender=Book)
+def create_book_stats(sender, instance, created, **kwargs):
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if created or previous_author_id is None:
+        BookStats.objects.get_or_create(book=instance, defaults={'title': instance.title})
+        stats.record_book_added(instance.author_id)
+    elif previous_author_id != instance.author_id:
+        stats.record_book_moved(instance.pk, previous_author_id, instance.author_id)
+    if not created and instance.title != getattr(instance, '_previous_title', None):
+        BookStats.objects.filter(book=instance).update(title=instance.title)
+    if not created and instance.embedding_hash != getattr(instance, '_previous_embedding_hash', None):
+        # Tastes hold the old vector; taking it back needs a recount.
+        taste.refresh_books([instance.pk])
+    refresh_documents(Book.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_delete, sender=Book)
+def discard_book_stats(sender, instance, **kwargs):
+    stats.record_book_removed(instance.pk, instance.author_id)
+    taste.discard_book(instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def discard_search_document(sender, instance, **kwargs):
+    # The document row goes away by cascade; only the in-memory index needs telling.
+    transaction.on_commit(get_search_backend().invalidate)
+
+
+@receiver(pre_delete, sender=User)
+def discard_user_stats(sender, instance, **kwargs):
+    # The user's ratings, favorites and readlist rows go away by cascade,
+    # which bypasses the views that keep the counters in step.
+    stats.discard_user(instance.pk)
+    neighbors.discard_user(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_catalog(sender, **kwargs):
+    # Bump after commit, otherwise another worker could reload the old rows
+    # and keep them under the new version.
+    transaction.on_commit(category_catalog.bump)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_stamp(sender, **kwargs):
+    transaction.on_commit(catalog_stamp.bump)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_fragment(sender, instance, **kwargs):
+    book_fragments.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_book_fragments(sender, **kwargs):
+    # Author and category names are embedded in every one of their books' fragments.
+    book_fragments.invalidate_all()
+
+
+@receiver(post_save, sender=UserComment)
+@receiver(post_delete, sender=UserComment)
+def bump_comment_stamp(sender, instance, **kwargs):
+    transaction.on_commit(comment_stamp(instance.book_id).bump)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def refresh_book_vector(sender, instance, **kwargs):
+    book_id = instance.pk
+    transaction.on_commit(lambda: book_vector_index.notify_changed([book_id]))
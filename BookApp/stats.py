@@ -0,0 +1,244 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from .caches import book_fragments, catalog_stamp
+from .models import Author, AuthorStats, Book, BookStats, FavBook, Rating, ReadList
+
+RATING_VALUES = range(6)
+
+# Book counters that roll up into the author's counters, and their author-side name.
+AUTHOR_ROLLUP = {
+    'favorite_count': 'fav_book_count',
+    'rating_sum': 'rating_sum',
+    'rating_count': 'rating_count',
+}
+
+# Book counters that show up in the public book and author payloads, or order
+# them; moving one changes the catalog ETags. Readlist counts appear in neither.
+CATALOG_FIELDS = {'favorite_count', 'rating_sum', 'rating_count'}
+
+
+def _stored_rating(value):
+    # Rating.rating is an IntegerField, so mirror what actually lands in the column.
+    return min(max(int(float(value)), 0), 5)
+
+
+def _updates(deltas):
+    return {field: F(field) + delta for field, delta in deltas.items() if delta}
+
+
+def _create_missing(model, pks):
+    # Stats rows created on demand, for rows that predate the tables, carry
+    # the copied sort key the listings order on.
+    if model is BookStats:
+        rows = [BookStats(book_id=pk, title=title) for pk, title in Book.objects.filter(id__in=pks).values_list('id', 'title')]
+    else:
+        rows = [AuthorStats(author_id=pk, name=name) for pk, name in Author.objects.filter(id__in=pks).values_list('id', 'name')]
+    model.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def _apply_author(author_id, **deltas):
+    updates = _updates(deltas)
+    if not updates or author_id is None:
+        return
+    # Every author counter is part of the author payload.
+    transaction.on_commit(catalog_stamp.bump)
+    if not AuthorStats.objects.filter(author_id=author_id).update(**updates):
+        _create_missing(AuthorStats, [author_id])
+        AuthorStats.objects.filter(author_id=author_id).update(**updates)
+
+
+def _apply(book_id, **deltas):
+    """
+    Add the given deltas to the counters of one book with a single UPDATE,
+    and roll the relevant ones up into the book's author.
+    Stats rows are created on demand for rows that predate the tables.
+    Call inside the same transaction as the write being counted.
+    """
+    updates = _updates(deltas)
+    if not updates:
+        return
+    if CATALOG_FIELDS.intersection(updates):
+        transaction.on_commit(catalog_stamp.bump)
+    if not BookStats.objects.filter(book_id=book_id).update(**updates):
+        _create_missing(BookStats, [book_id])
+        BookStats.objects.filter(book_id=book_id).update(**updates)
+
+    author_deltas = {AUTHOR_ROLLUP[field]: delta for field, delta in deltas.items() if field in AUTHOR_ROLLUP}
+    author_updates = _updates(author_deltas)
+    if author_updates and not AuthorStats.objects.filter(author__book_books=book_id).update(**author_updates):
+        author_id = Book.objects.filter(pk=book_id).values_list('author_id', flat=True).first()
+        _apply_author(author_id, **author_deltas)
+
+
+def _apply_rows(model, key, row_deltas):
+    """
+    Add {pk: {field: delta}} to many stats rows with one UPDATE for all of
+    them, creating any that are missing first. Returns the fields that moved.
+    """
+    row_deltas = {pk: {field: delta for field, delta in deltas.items() if delta} for pk, deltas in row_deltas.items()}
+    row_deltas = {pk: deltas for pk, deltas in row_deltas.items() if deltas}
+    if not row_deltas:
+        return set()
+    existing = set(model.objects.filter(pk__in=row_deltas).values_list('pk', flat=True))
+    if len(existing) < len(row_deltas):
+        _create_missing(model, row_deltas.keys() - existing)
+    fields = sorted(set().union(*row_deltas.values()))
+    rows = []
+    for pk, deltas in row_deltas.items():
+        row = model(**{key: pk})
+        for field in fields:
+            setattr(row, field, F(field) + deltas.get(field, 0))
+        rows.append(row)
+    model.objects.bulk_update(rows, fields)
+    return set(fields)
+
+
+def apply_many(book_deltas):
+    """
+    Like _apply for {book_id: {field: delta}} over many books, in a fixed
+    number of queries however many books there are: the deltas are summed
+    per author and both tables are updated set-based.
+    Call inside the same transaction as the writes being counted.
+    """
+    fields = _apply_rows(BookStats, 'book_id', book_deltas)
+    if CATALOG_FIELDS.intersection(fields):
+        transaction.on_commit(catalog_stamp.bump)
+    rollup = set(AUTHOR_ROLLUP).intersection(fields)
+    if not rollup:
+        return
+    author_deltas = {}
+    for book_id, author_id in Book.objects.filter(id__in=book_deltas).values_list('id', 'author_id'):
+        if author_id is None:
+            continue
+        totals = author_deltas.setdefault(author_id, {})
+        for field in rollup:
+            author_field = AUTHOR_ROLLUP[field]
+            totals[author_field] = totals.get(author_field, 0) + book_deltas[book_id].get(field, 0)
+    _apply_rows(AuthorStats, 'author_id', author_deltas)
+
+
+def rating_deltas(old=None, new=None):
+    """The counter deltas for moving a rating from `old` to `new` (either may be None)."""
+    deltas = {}
+    if old is not None:
+        old = _stored_rating(old)
+        deltas['rating_sum'] = -old
+        deltas['rating_count'] = -1
+        deltas[f'rating_{old}'] = -1
+    if new is not None:
+        new = _stored_rating(new)
+        deltas['rating_sum'] = deltas.get('rating_sum', 0) + new
+        deltas['rating_count'] = deltas.get('rating_count', 0) + 1
+        deltas[f'rating_{new}'] = deltas.get(f'rating_{new}', 0) + 1
+    return deltas
+
+
+def record_rating(book_id, old=None, new=None):
+    """
+    Move a user's rating of a book from `old` to `new`.
+    Pass old=None for a new rating and new=None for a removed one.
+    """
+    _apply(book_id, **rating_deltas(old, new))
+    # average_rating is part of the book's cached fragment.
+    book_fragments.invalidate([book_id])
+
+
+def _add_deltas(book_deltas, book_id, deltas):
+    totals = book_deltas.setdefault(book_id, {})
+    for field, delta in deltas.items():
+        totals[field] = totals.get(field, 0) + delta
+
+
+def record_ratings(changes):
+    """record_rating for many (book_id, old, new) changes at once, set-based."""
+    book_deltas = {}
+    for book_id, old, new in changes:
+        _add_deltas(book_deltas, book_id, rating_deltas(old, new))
+    apply_many(book_deltas)
+    book_fragments.invalidate(book_deltas)
+
+
+def _book_rollup(book_id):
+    book_stats = BookStats.objects.filter(book_id=book_id).values(*AUTHOR_ROLLUP).first() or {}
+    return {AUTHOR_ROLLUP[field]: value for field, value in book_stats.items()}
+
+
+def record_book_added(author_id):
+    _apply_author(author_id, book_count=1)
+
+
+def record_book_removed(book_id, author_id):
+    """Take a book, and everything counted against it, out of its author's counters."""
+    rollup = _book_rollup(book_id)
+    _apply_author(author_id, book_count=-1, **{field: -value for field, value in rollup.items()})
+
+
+def record_book_moved(book_id, old_author_id, new_author_id):
+    rollup = _book_rollup(book_id)
+    _apply_author(old_author_id, book_count=-1, **{field: -value for field, value in rollup.items()})
+    _apply_author(new_author_id, book_count=1, **rollup)
+
+
+def discard_user(user_id):
+    """
+    Take every rating, favorite and readlist entry of a user out of the
+    counters, summed per book and applied set-based with apply_many.
+    """
+    book_deltas = {}
+    for book_id in FavBook.objects.filter(user_id=user_id).values_list('book_id', flat=True):
+        _add_deltas(book_deltas, book_id, {'favorite_count': -1})
+    for book_id in ReadList.objects.filter(user_id=user_id).values_list('book_id', flat=True):
+        _add_deltas(book_deltas, book_id, {'readlist_count': -1})
+    rated = []
+    for book_id, rating in Rating.objects.filter(user_id=user_id).values_list('book_id', 'rating'):
+        _add_deltas(book_deltas, book_id, rating_deltas(old=rating))
+        rated.append(book_id)
+    apply_many(book_deltas)
+    book_fragments.invalidate(rated)
+
+
+def compute_book_stats():
+    """
+    Recount every book's counters from the Rating, FavBook and ReadList tables,
+    along with the title copied for sorting. Returns {book_id: {field: value}}
+    for all books, including ones with no activity.
+    """
+    rating_aggregates = {
+        'rating_sum': Sum('rating'),
+        'rating_count': Count('id'),
+    }
+    for value in RATING_VALUES:
+        rating_aggregates[f'rating_{value}'] = Count('id', filter=Q(rating=value))
+
+    expected = {}
+    empty = {field.name: 0 for field in BookStats._meta.concrete_fields if field.name not in ('book', 'title')}
+    for book_id, title in Book.objects.values_list('id', 'title').iterator():
+        expected[book_id] = dict(empty, title=title)
+    for row in Rating.objects.values('book_id').annotate(**rating_aggregates).order_by():
+        book_id = row.pop('book_id')
+        if book_id in expected:
+            expected[book_id].update({k: v or 0 for k, v in row.items()})
+    for model, field in ((FavBook, 'favorite_count'), (ReadList, 'readlist_count')):
+        for book_id, total in model.objects.values_list('book_id').annotate(total=Count('id')).order_by():
+            if book_id in expected:
+                expected[book_id][field] = total
+    return expected
+
+
+def compute_author_stats(book_stats=None):
+    """
+    Roll book counters up per author. Pass the result of compute_book_stats()
+    to avoid recounting it. Returns {author_id: {field: value}} for all authors.
+    """
+    if book_stats is None:
+        book_stats = compute_book_stats()
+    expected = {}
+    empty = {field.name: 0 for field in AuthorStats._meta.concrete_fields if field.name not in ('author', 'name')}
+    for author_id, name in Author.objects.values_list('id', 'name').iterator():
+        expected[author_id] = dict(empty, name=name)
+    for book_id, author_id in Book.objects.values_list('id', 'author_id').iterator():
+        totals = expected[author_id]
+        totals['book_count'] += 1
+        for book_field, author_field in AUTHOR_ROLLUP.items():
+            totals[author_field] += book_stats.get(book_id, {}).get(book_field, 0)
+    return expected
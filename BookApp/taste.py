@@ -0,0 +1,303 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from .caches import VersionStamp, register_stats
+from .models import Book, FavBook, Rating, ReadList, UserTaste
+from .stats import _stored_rating
+from .vectors import book_vector_index
+
+# Below this total weight a taste is treated as empty, so the rounding error
+# left after removing every book does not turn into recommendations.
+EMPTY_WEIGHT = 1e-6
+
+
+def rating_weight(rating):
+    if rating is None or _stored_rating(rating) < settings.TASTE_MIN_RATING:
+        return 0.0
+    return settings.TASTE_WEIGHTS['rating']
+
+
+def _apply(user_id, weights):
+    """
+    Add each book's unit embedding, times its weight in {book_id: weight},
+    to the user's taste: one query for the embeddings and one locked update.
+    Books without an embedding do not count. Call inside the same
+    transaction as the writes being recorded.
+
+    This relies on each embedding being the one the taste was built from;
+    refresh_books() restores that whenever embeddings change.
+    """
+    weights = {book_id: weight for book_id, weight in weights.items() if weight}
+    if not weights:
+        return
+    embeddings = dict(Book.objects.filter(id__in=weights).exclude(embedding=None).values_list('id', 'embedding'))
+    if not embeddings:
+        return
+    matrix = np.vstack(list(embeddings.values())).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    book_weights = np.array([weights[book_id] for book_id in embeddings], dtype=np.float32)
+    vector = book_weights @ matrix
+    weight = float(book_weights.sum())
+
+    taste, _ = UserTaste.objects.select_for_update().get_or_create(user_id=user_id)
+    taste.weight += weight
+    if taste.weight <= EMPTY_WEIGHT:
+        taste.vector_sum, taste.weight = None, 0.0
+    elif taste.vector_sum is None:
+        taste.vector_sum = vector
+    else:
+        taste.vector_sum = taste.vector_sum + vector
+    taste.save()
+
+
+def record_favorites(user_id, deltas):
+    """Add ({book_id: +1}) or remove ({book_id: -1}) favorites from the user's taste."""
+    _apply(user_id, {book_id: delta * settings.TASTE_WEIGHTS['favorite'] for book_id, delta in deltas.items()})
+
+
+def record_readlists(user_id, deltas):
+    """record_favorites for readlist entries."""
+    _apply(user_id, {book_id: delta * settings.TASTE_WEIGHTS['readlist'] for book_id, delta in deltas.items()})
+
+
+def record_rating(user_id, book_id, old=None, new=None):
+    """
+    Move a user's rating of a book from `old` to `new`, as in stats.record_rating.
+    Only ratings of at least TASTE_MIN_RATING count towards the taste.
+    """
+    record_ratings(user_id, [(book_id, old, new)])
+
+
+def record_ratings(user_id, changes):
+    """record_rating for many (book_id, old, new) changes of one user."""
+    weights = defaultdict(float)
+    for book_id, old, new in changes:
+        weights[book_id] += rating_weight(new) - rating_weight(old)
+    _apply(user_id, weights)
+
+
+def interaction_weights(**filters):
+    """Taste weight of every (user_id, book_id) pair matching `filters`."""
+    weights = defaultdict(float)
+    for user_id, book_id in FavBook.objects.filter(**filters).values_list('user_id', 'book_id'):
+        weights[user_id, book_id] += settings.TASTE_WEIGHTS['favorite']
+    for user_id, book_id in ReadList.objects.filter(**filters).values_list('user_id', 'book_id'):
+        weights[user_id, book_id] += settings.TASTE_WEIGHTS['readlist']
+    high_ratings = Rating.objects.filter(**filters, rating__gte=settings.TASTE_MIN_RATING)
+    for user_id, book_id in high_ratings.values_list('user_id', 'book_id'):
+        weights[user_id, book_id] += settings.TASTE_WEIGHTS['rating']
+    return weights
+
+
+def discard_book(book_id):
+    """Take a book that is about to be deleted out of every taste it is part of."""
+    for (user_id, _), weight in interaction_weights(book_id=book_id).items():
+        _apply(user_id, {book_id: -weight})
+
+
+def compute_tastes(user_ids=None):
+    """
+    Recompute taste vectors from the FavBook, ReadList and Rating tables, for
+    the given users or for everyone. Returns {user_id: (vector_sum, weight)}
+    for the users with at least one embedded book.
+    """
+    filters = {} if user_ids is None else {'user_id__in': user_ids}
+    weights = interaction_weights(**filters)
+    books = Book.objects.exclude(embedding=None)
+    if user_ids is not None:
+        books = books.filter(id__in={book_id for _, book_id in weights})
+    embeddings = dict(books.values_list('id', 'embedding'))
+    pairs = [(user_id, book_id, weight) for (user_id, book_id), weight in weights.items() if book_id in embeddings]
+    if not pairs:
+        return {}
+
+    users = sorted({user_id for user_id, _, _ in pairs})
+    rows = np.searchsorted(users, [user_id for user_id, _, _ in pairs])
+    pair_weights = np.array([weight for _, _, weight in pairs], dtype=np.float32)
+    matrix = np.vstack([embeddings[book_id] for _, book_id, _ in pairs]).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    sums = np.zeros((len(users), matrix.shape[1]), dtype=np.float32)
+    np.add.at(sums, rows, matrix * pair_weights[:, None])
+    totals = np.bincount(rows, weights=pair_weights, minlength=len(users))
+    return {user_id: (sums[row], float(totals[row])) for row, user_id in enumerate(users)}
+
+
+def store_tastes(user_ids):
+    """
+    Recompute and save the taste vectors of `user_ids`, dropping the ones
+    left without an embedded book. Call inside a transaction. Returns the
+    number of vectors written.
+    """
+    tastes = compute_tastes(user_ids)
+    UserTaste.objects.filter(user_id__in=user_ids).exclude(user_id__in=list(tastes)).delete()
+    UserTaste.objects.bulk_create(
+        [UserTaste(user_id=user_id, vector_sum=vector, weight=weight) for user_id, (vector, weight) in tastes.items()],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['vector_sum', 'weight'],
+    )
+    return len(tastes)
+
+
+def refresh_books(book_ids):
+    """
+    Recompute the tastes of every user who interacted with `book_ids`, after
+    those books' embeddings changed. Call inside a transaction.
+    """
+    user_ids = sorted({user_id for user_id, _ in interaction_weights(book_id__in=book_ids)})
+    if user_ids:
+        store_tastes(user_ids)
+        for user_id in user_ids:
+            recommendation_cache.invalidate(user_id)
+    return len(user_ids)
+
+
+def owned_book_ids(user_id):
+    """Books the user already has a favorite, readlist or rating row for."""
+    favorites = FavBook.objects.filter(user_id=user_id).values_list('book_id', flat=True)
+    readlist = ReadList.objects.filter(user_id=user_id).values_list('book_id', flat=True)
+    rated = Rating.objects.filter(user_id=user_id).values_list('book_id', flat=True)
+    return set(favorites.union(readlist, rated))
+
+
+def recommend_books(user_id, top_n=10, similarity_threshold=0.8):
+    """
+    Up to `top_n` (book_id, similarity) pairs of books the user does not have
+    yet whose cosine similarity to their taste is above `similarity_threshold`,
+    most similar first.
+    """
+    taste = (
+        UserTaste.objects.filter(user_id=user_id, weight__gt=EMPTY_WEIGHT)
+        .values_list('vector_sum', flat=True)
+        .first()
+    )
+    if taste is None or top_n <= 0:
+        return []
+    owned = owned_book_ids(user_id)
+    # Ask for enough extra matches that dropping the owned books still leaves top_n.
+    matches = book_vector_index.search(taste, similarity_threshold, top_n + len(owned))
+    return [(book_id, similarity) for book_id, similarity in matches if book_id not in owned][:top_n]
+
+
+class RecommendationCache:
+    """
+    Ranked recommendation lists in the Django cache, per user and similarity
+    threshold. Every user has their own version stamp; a write that changes
+    their taste calls invalidate(), which bumps it once the transaction
+    commits, so their next read recomputes.
+
+    Each list holds at least `size` matches, so any top_n up to that is a
+    slice of the same entry. With `background=True` a user who asked for
+    recommendations in the last `hot_seconds` has their lists recomputed by
+    a small thread pool right after such a write, and reads that find an
+    outdated list are served it while a refresh runs.
+    """
+
+    def __init__(self, compute, ttl, size, background=False, hot_seconds=15 * 60, workers=2):
+        self.compute = compute
+        self.ttl = ttl
+        self.size = size
+        self.background = background
+        self.hot_seconds = hot_seconds
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _stamp(self, user_id):
+        return VersionStamp(f'bookapp:recommendations:version:{user_id}')
+
+    def _key(self, user_id, threshold):
+        return f'bookapp:recommendations:{user_id}:{threshold!r}'
+
+    def _hot_key(self, user_id):
+        return f'bookapp:recommendations:hot:{user_id}'
+
+    def _store(self, user_id, threshold, version, count):
+        matches = self.compute(user_id, count, threshold)
+        entry = {'version': version, 'matches': matches, 'complete': len(matches) < count}
+        cache.set(self._key(user_id, threshold), entry, timeout=self.ttl)
+        return matches
+
+    def get(self, user_id, top_n, threshold):
+        """The user's top_n (book_id, similarity) pairs above `threshold`."""
+        version = self._stamp(user_id).current()
+        if self.background:
+            thresholds = cache.get(self._hot_key(user_id)) or set()
+            cache.set(self._hot_key(user_id), thresholds | {threshold}, timeout=self.hot_seconds)
+        entry = cache.get(self._key(user_id, threshold))
+        usable = entry is not None and (entry['complete'] or top_n <= len(entry['matches']))
+        if usable and entry['version'] == version:
+            with self._lock:
+                self.hits += 1
+            return entry['matches'][:top_n]
+        if usable and self.background:
+            with self._lock:
+                self.stale_hits += 1
+            self._schedule(user_id, threshold)
+            return entry['matches'][:top_n]
+        with self._lock:
+            self.misses += 1
+        return self._store(user_id, threshold, version, max(top_n, self.size))[:top_n]
+
+    def invalidate(self, user_id):
+        """Drop the user's lists after the current transaction commits."""
+        def bump():
+            self._stamp(user_id).bump()
+            if self.background:
+                for threshold in cache.get(self._hot_key(user_id)) or ():
+                    self._schedule(user_id, threshold)
+        transaction.on_commit(bump)
+
+    def _schedule(self, user_id, threshold):
+        with self._lock:
+            if (user_id, threshold) in self._pending:
+                return
+            self._pending.add((user_id, threshold))
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='recommendation-refresh')
+        self._executor.submit(self._refresh, user_id, threshold)
+
+    def _refresh(self, user_id, threshold):
+        close_old_connections()
+        try:
+            self._store(user_id, threshold, self._stamp(user_id).current(), self.size)
+            with self._lock:
+                self.refreshes += 1
+        finally:
+            with self._lock:
+                self._pending.discard((user_id, threshold))
+            close_old_connections()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                'background_refreshes': self.refreshes,
+                'pending_refreshes': len(self._pending),
+            }
+
+
+recommendation_cache = RecommendationCache(
+    recommend_books,
+    ttl=settings.RECOMMENDATION_CACHE_TTL,
+    size=settings.RECOMMENDATION_CACHE_SIZE,
+    background=settings.RECOMMENDATION_BACKGROUND_REFRESH,
+    hot_seconds=settings.RECOMMENDATION_HOT_SECONDS,
+    workers=settings.RECOMMENDATION_REFRESH_WORKERS,
+)
+register_stats('recommendation_cache', recommendation_cache.stats)
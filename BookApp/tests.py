@@ -1,3 +1,949 @@
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+import torch
+from django.conf import settings
 from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from filelock import FileLock
+from BookApp.models import (
+    Author, AuthorStats, BookNeighbors, Category, Book, BookStats, FavBook, Rating, ReadList, UserComment, UserTaste,
+)
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from BookApp import embeddings
+from BookApp.caches import VersionStamp, category_catalog
+from BookApp.embeddings import (
+    LazyResource, QueryEmbeddingCache, load_model, mean_pool, model_identity, quantize_model,
+)
+from BookApp.inference import EmbeddingBatcher
+from BookApp.management.commands.benchmark_embeddings import cosine_agreement
+from BookApp.neighbors import readers_also_liked
+from BookApp.pagination import encode_cursor
+from BookApp.search import search_books
+from BookApp.stats import discard_user
+from BookApp.taste import RecommendationCache, compute_tastes, recommendation_cache
+from BookApp.toggles import toggle
+from BookApp.vectors import BookVectorIndex, IVFBookVectorIndex
+from BookApp.views import AuthorView, BookView, CategoryView, CommentView
+
+
+class BookFixtureMixin:
+    author_name = 'Test Author'
+    category_name = 'Test Category'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='ReaderPass123')
+        self.author = Author.objects.create(name=self.author_name)
+        self.category = Category.objects.create(name=self.category_name)
+
+    def create_book(self, title='Test Book', author=None, category=None):
+        return Book.objects.create(
+            title=title,
+            author=author or self.author,
+            summary='Test Summary',
+            cover='http://example.com/cover.jpg',
+            category=category or self.category,
+            page_count=100,
+        )
+
+
+class BookStatsTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='OtherPass123')
+        self.book = self.create_book()
+
+    def test_stats_row_created_with_book(self):
+        self.assertTrue(BookStats.objects.filter(book=self.book).exists())
+
+    def test_rating_writes_update_counters(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('add-rating'), {'book_id': self.book.id, 'rating': 4})
+        self.client.force_authenticate(user=self.other)
+        self.client.post(reverse('add-rating'), {'book_id': self.book.id, 'rating': 2})
+        self.client.put(reverse('update-rating'), {'book_id': self.book.id, 'rating': 5})
+
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual(stats.rating_count, 2)
+        self.assertEqual(stats.rating_sum, 9)
+        self.assertEqual(stats.rating_histogram, [0, 0, 0, 0, 1, 1])
+        self.assertEqual(stats.average_rating, 4.5)
+
+    def test_favorite_and_readlist_toggles_update_counters(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('add-to-fav'), {'book_id': self.book.id})
+        self.client.post(reverse('add-to-readlist'), {'book_id': self.book.id})
+        self.assertEqual(BookStats.objects.get(book=self.book).favorite_count, 1)
+        self.assertEqual(BookStats.objects.get(book=self.book).readlist_count, 1)
+
+        self.client.post(reverse('add-to-fav'), {'book_id': self.book.id})
+        self.assertEqual(BookStats.objects.get(book=self.book).favorite_count, 0)
+
+    def test_deleting_user_releases_counters(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('add-to-fav'), {'book_id': self.book.id})
+        self.client.post(reverse('add-rating'), {'book_id': self.book.id, 'rating': 3})
+        self.user.delete()
+
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual((stats.favorite_count, stats.rating_count, stats.rating_sum), (0, 0, 0))
+
+    def test_discarding_a_user_takes_a_fixed_number_of_queries(self):
+        books = [self.create_book(title=f'Book {i}') for i in range(10)]
+        for book in books:
+            FavBook.objects.create(user=self.other, book=book)
+            ReadList.objects.create(user=self.other, book=book)
+            Rating.objects.create(user=self.other, book=book, rating=4)
+        call_command('rebuild_book_stats', verbosity=0)
+        with self.assertNumQueries(8):
+            discard_user(self.other.id)
+        self.assertEqual(AuthorStats.objects.get(author=self.author).rating_sum, 0)
+        self.assertFalse(BookStats.objects.exclude(favorite_count=0, readlist_count=0, rating_count=0).exists())
+
+    def test_book_list_does_not_aggregate_per_book(self):
+        for i in range(5):
+            self.create_book(title=f'Book {i}')
+        cache.clear()
+        # The page, then one query for the books not in the fragment cache.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('get-book'), {'limit': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_rebuild_command_reconciles_drift(self):
+        FavBook.objects.create(user=self.user, book=self.book)
+        Rating.objects.create(user=self.user, book=self.book, rating=5)
+        BookStats.objects.filter(book=self.book).delete()
+
+        call_command('rebuild_book_stats', verbosity=0)
+
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual(stats.favorite_count, 1)
+        self.assertEqual(stats.rating_5, 1)
+        self.assertEqual(stats.average_rating, 5)
+        self.assertEqual(stats.title, 'Test Book')
+
+    def test_catalog_orders_on_the_stats_table(self):
+        self.book.title = 'Renamed'
+        self.book.save()
+        self.assertEqual(BookStats.objects.get(book=self.book).title, 'Renamed')
+        first = self.create_book(title='A Book')
+        response = self.client.get(reverse('get-book'))
+        self.assertEqual([book['id'] for book in response.data['data']], [first.id, self.book.id])
+
+
+class KeysetPaginationTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.books = [self.create_book(title=f'Book {i % 3}') for i in range(7)]
+        for book in self.books[:2]:
+            FavBook.objects.create(user=self.user, book=book)
+            BookStats.objects.filter(book=book).update(favorite_count=1)
+
+    def collect(self, url, params):
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(url, dict(params, **({'cursor': cursor} if cursor else {})))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.data['data'])
+            cursor = response.data['next']
+            if cursor is None:
+                return seen
+
+    def test_book_pages_cover_catalog_once(self):
+        ids = self.collect(reverse('get-book'), {'limit': 3})
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(set(ids), {book.id for book in self.books})
+        self.assertEqual(set(ids[:2]), {book.id for book in self.books[:2]})
+
+    def test_search_pages_follow_rank(self):
+        self.books[4].title = 'Book of the Book'
+        self.books[4].save()
+        ids = self.collect(reverse('get-book'), {'s': 'Book', 'limit': 3})
+        self.assertEqual(len(ids), len(set(ids)))
+        ranked = search_books(Book.objects.all(), 'Book').order_by('-search_rank', 'id')
+        self.assertEqual(ids, list(ranked.values_list('id', flat=True)))
+        self.assertEqual(ids[0], self.books[4].id)
+
+    def test_comment_pages_newest_first(self):
+        for i in range(5):
+            UserComment.objects.create(user=self.user, book=self.books[0], content=f'comment {i}')
+        self.client.force_authenticate(user=self.user)
+        ids = self.collect(reverse('get-comment'), {'book_id': self.books[0].id, 'limit': 2})
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 5)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('get-book'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Well-formed cursors whose values do not fit the ordering fields.
+        for url, key in [
+            (reverse('get-book'), ['abc', 'x', 1]),
+            (reverse('get-book'), [None, 'x', 1]),
+            (reverse('get-author'), [1, 'x', 'abc']),
+        ]:
+            response = self.client.get(url, {'cursor': encode_cursor(key)})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, key)
+
+
+class CommentFeedTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = self.create_book()
+        self.client.force_authenticate(user=self.user)
+
+    def test_single_query_and_since_polling(self):
+        for i in range(3):
+            UserComment.objects.create(user=self.user, book=self.book, content=f'comment {i}')
+        with self.assertNumQueries(1):
+            first = self.client.get(reverse('get-comment'), {'book_id': self.book.id})
+        self.assertEqual(first.data['data'][0]['user']['username'], 'reader')
+        latest = first.data['latest']
+
+        empty = self.client.get(reverse('get-comment'), {'book_id': self.book.id, 'since': latest})
+        self.assertEqual((empty.data['data'], empty.data['latest']), ([], latest))
+
+        for i in range(3, 5):
+            UserComment.objects.create(user=self.user, book=self.book, content=f'comment {i}')
+        fresh = self.client.get(reverse('get-comment'), {'book_id': self.book.id, 'since': latest})
+        self.assertEqual([comment['content'] for comment in fresh.data['data']], ['comment 3', 'comment 4'])
+        again = self.client.get(reverse('get-comment'), {'book_id': self.book.id, 'since': fresh.data['latest']})
+        self.assertEqual(again.data['data'], [])
+
+
+class AuthorStatsTests(BookFixtureMixin, TestCase):
+    author_name = 'Popular Author'
+
+    def setUp(self):
+        super().setUp()
+        self.quiet_author = Author.objects.create(name='Quiet Author')
+        self.book = self.create_book()
+        self.second_book = self.create_book(title='Second Book')
+        self.create_book(title='Quiet Book', author=self.quiet_author)
+
+    def test_counters_follow_books_ratings_and_favorites(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('add-to-fav'), {'book_id': self.book.id})
+        self.client.post(reverse('add-rating'), {'book_id': self.book.id, 'rating': 4})
+        self.client.post(reverse('add-rating'), {'book_id': self.second_book.id, 'rating': 2})
+
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual(stats.book_count, 2)
+        self.assertEqual(stats.fav_book_count, 1)
+        self.assertEqual(stats.average_rating, 3)
+
+        self.second_book.author = self.quiet_author
+        self.second_book.save()
+        self.assertEqual(AuthorStats.objects.get(author=self.author).rating_count, 1)
+        self.assertEqual(AuthorStats.objects.get(author=self.quiet_author).book_count, 2)
+
+        self.book.delete()
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual((stats.book_count, stats.fav_book_count, stats.rating_count), (0, 0, 0))
+
+    def test_leaderboard_orders_by_favorites(self):
+        FavBook.objects.create(user=self.user, book=self.book)
+        call_command('rebuild_book_stats', verbosity=0)
+
+        response = self.client.get(reverse('get-author'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.data['data'][0]
+        self.assertEqual(first['id'], self.author.id)
+        self.assertEqual(first['book_count'], 2)
+        self.assertEqual(first['fav_book_count'], 1)
+
+    def test_leaderboard_pages_on_the_stats_table(self):
+        AuthorStats.objects.filter(author=self.quiet_author).delete()
+        call_command('rebuild_book_stats', verbosity=0)
+        self.quiet_author.name = 'A Quiet Author'
+        self.quiet_author.save()
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('get-author'), {'limit': 1, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(response.data['data'])
+            cursor = response.data['next']
+            if cursor is None:
+                break
+        # Both authors tie at zero favorites, so the copied name decides.
+        self.assertEqual([author['id'] for author in seen], [self.quiet_author.id, self.author.id])
+        self.assertEqual((seen[0]['book_count'], seen[0]['fav_book_count']), (1, 0))
+
+
+class CategoryCatalogTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_book()
+        category_catalog.bump()
+
+    def test_repeated_reads_skip_the_database(self):
+        self.client.get(reverse('get-categories'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('get-categories'), {'category_id': self.category.id})
+        self.assertEqual(response.data['data'][0]['book_count'], 1)
+        self.assertGreaterEqual(category_catalog.stats()['hits'], 1)
+
+    def test_book_write_invalidates_catalog(self):
+        self.client.get(reverse('get-categories'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_book(title='Another Book')
+        response = self.client.get(reverse('get-categories'))
+        self.assertEqual(response.data['data'][0]['book_count'], 2)
+
+    def test_lost_stamp_does_not_return_to_an_old_version(self):
+        stamp = VersionStamp('bookapp:test:version')
+        seen = {stamp.current(), stamp.bump()}
+        cache.delete(stamp.key)
+        self.assertNotIn(stamp.current(), seen)
+
+
+class BookSearchTests(BookFixtureMixin, TestCase):
+    author_name = 'Jane Austen'
+    category_name = 'Classics'
+
+    def setUp(self):
+        super().setUp()
+        self.other_author = Author.objects.create(name='Mary Shelley')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pride = self.create_book(title='Pride and Prejudice')
+            self.emma = self.create_book(title='Emma')
+            self.frankenstein = self.create_book(title='Frankenstein', author=self.other_author)
+
+    def search(self, keyword):
+        response = self.client.get(reverse('get-book'), {'s': keyword})
+        if response.status_code != status.HTTP_200_OK:
+            return []
+        return [item['id'] for item in response.data['data']]
+
+    def test_title_prefix_and_author_match(self):
+        self.assertEqual(self.search('prej'), [self.pride.id])
+        self.assertEqual(set(self.search('austen')), {self.pride.id, self.emma.id})
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search('austen emma'), [self.emma.id])
+        self.assertEqual(self.search('austen frankenstein'), [])
+
+    def test_index_follows_author_rename(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_author.name = 'Mary Wollstonecraft Shelley'
+            self.other_author.save()
+        self.assertEqual(self.search('wollstonecraft'), [self.frankenstein.id])
+
+
+def vector(*values):
+    """A Book.embedding-sized vector starting with the given components."""
+    return list(values) + [0.0] * (settings.EMBEDDING_DIMENSIONS - len(values))
+
+
+class BookVectorIndexTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = BookVectorIndex()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.north = self.create_book(title='North')
+            self.north.embedding = vector(1.0, 0.0, 0.0)
+            self.north.save()
+            self.east = self.create_book(title='North East')
+            self.east.embedding = vector(0.8, 0.6, 0.0)
+            self.east.save()
+            self.create_book(title='No Embedding')
+
+    def test_threshold_and_count(self):
+        matches = self.index.search(vector(1.0, 0.0, 0.0), match_threshold=0.5, match_count=10)
+        self.assertEqual([book_id for book_id, _ in matches], [self.north.id, self.east.id])
+        self.assertAlmostEqual(matches[1][1], 0.8, places=5)
+        self.assertEqual(len(self.index.search(vector(1.0, 0.0, 0.0), match_threshold=0.5, match_count=1)), 1)
+        self.assertEqual(self.index.search(vector(1.0, 0.0, 0.0), match_threshold=0.9, match_count=10)[0][0], self.north.id)
+
+    def test_incremental_updates(self):
+        self.index.search(vector(1.0, 0.0, 0.0))
+        with self.captureOnCommitCallbacks(execute=True):
+            west = self.create_book(title='West')
+            west.embedding = vector(-1.0, 0.0, 0.0)
+            west.save()
+            self.north.embedding = vector(0.0, 0.0, 1.0)
+            self.north.save()
+            self.east.delete()
+        with self.assertNumQueries(1):
+            matches = self.index.search(vector(-1.0, 0.0, 0.0), match_threshold=0.5)
+        self.assertEqual(matches[0][0], west.id)
+        self.assertEqual(self.index.search(vector(0.0, 0.0, 1.0), match_threshold=0.5)[0][0], self.north.id)
+        self.assertEqual(self.index.stats()['size'], 2)
+
+    def test_embedding_round_trips_as_float32_bytes(self):
+        stored = Book.objects.values_list('embedding', flat=True).get(pk=self.east.pk)
+        self.assertEqual(stored.dtype.name, 'float32')
+        self.assertEqual(stored[:2].tolist(), [0.800000011920929, 0.6000000238418579])
+        self.assertEqual(stored.nbytes, settings.EMBEDDING_DIMENSIONS * 4)
+        self.north.embedding = [1.0, 0.0]
+        with self.assertRaises(ValueError):
+            self.north.save()
+
+
+class IVFBookVectorIndexTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(4, settings.EMBEDDING_DIMENSIONS))
+        books = [
+            Book(
+                title=f'Book {cluster}-{i}', author=self.author, category=self.category, summary='Test Summary',
+                cover='http://example.com/cover.jpg', page_count=100,
+                embedding=centers[cluster] + 0.1 * rng.normal(size=settings.EMBEDDING_DIMENSIONS),
+            )
+            for cluster in range(4) for i in range(16)
+        ]
+        Book.objects.bulk_create(books)
+        self.embeddings = dict(Book.objects.values_list('id', 'embedding'))
+
+    def test_probing_every_list_matches_exact_search(self):
+        index = IVFBookVectorIndex(nprobe=1)
+        exact = BookVectorIndex()
+        book_id, query = next(iter(self.embeddings.items()))
+        self.assertEqual(index.search(query, 0.5, 5)[0][0], book_id)
+        self.assertEqual(index.stats()['nlist'], 8)
+        index.nprobe = 8
+        self.assertEqual(index.search(query, 0.0, 20), exact.search(query, 0.0, 20))
+
+    def test_saved_index_loads_without_reading_embeddings(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'index.npz')
+        query = next(iter(self.embeddings.values()))
+        expected = IVFBookVectorIndex(path, nprobe=2).search(query, 0.0, 5)
+        restored = IVFBookVectorIndex(path, nprobe=2)
+        # One query checks the file against the database instead of reloading it.
+        with self.assertNumQueries(1):
+            self.assertEqual(restored.search(query, 0.0, 5), expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book = self.create_book(title='Newcomer')
+            book.embedding = query
+            book.save()
+        self.assertIn(book.id, [book_id for book_id, _ in restored.search(query, 0.9, 20)])
+
+    def test_saved_index_is_ignored_once_the_embeddings_change(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'index.npz')
+        (book_id, query), (other_id, _) = list(self.embeddings.items())[:2]
+        IVFBookVectorIndex(path, nprobe=8).sync()
+        # A write whose notification never reached this process's cache.
+        Book.objects.filter(pk=other_id).update(embedding=query, embedding_hash='changed')
+        matches = IVFBookVectorIndex(path, nprobe=8).search(query, 0.9999, 5)
+        self.assertEqual({book_id for book_id, _ in matches}, {book_id, other_id})
+
+
+class RecommendationTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+        self.books = {}
+        for title, embedding in [('Liked', vector(1.0, 0.0)), ('Similar', vector(0.9, 0.1)), ('Different', vector(0.0, 1.0))]:
+            self.books[title] = self.create_book(title=title)
+            self.books[title].embedding = embedding
+            self.books[title].save()
+        # Recommendation lists are cached per user id, which the test database reuses.
+        cache.clear()
+        patcher = mock.patch('BookApp.taste.book_vector_index', BookVectorIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def recommend(self):
+        return self.client.get(reverse('recommend-books'), {'top_n': 5, 'similarity_threshold': 0.5})
+
+    def test_recommends_similar_books_the_user_does_not_have(self):
+        self.assertEqual(self.recommend().status_code, status.HTTP_404_NOT_FOUND)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add-to-fav'), {'book_id': self.books['Liked'].id})
+            self.client.post(reverse('add-rating'), {'book_id': self.books['Different'].id, 'rating': 2})
+        self.assertEqual(UserTaste.objects.get(user=self.user).weight, 1.0)
+
+        response = self.recommend()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['title'] for book in response.data['recommendations']], ['Similar'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add-to-fav'), {'book_id': self.books['Liked'].id})
+        self.assertFalse(UserTaste.objects.filter(user=self.user, vector_sum__isnull=False).exists())
+        self.assertEqual(self.recommend().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_lists_are_cached_until_the_user_writes(self):
+        self.client.post(reverse('add-to-fav'), {'book_id': self.books['Liked'].id})
+        self.assertEqual(recommendation_cache.get(self.user.id, 5, 0.5), [(self.books['Similar'].id, mock.ANY)])
+        with self.assertNumQueries(0):
+            recommendation_cache.get(self.user.id, 2, 0.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add-to-readlist'), {'book_id': self.books['Similar'].id})
+        self.assertEqual(recommendation_cache.get(self.user.id, 5, 0.5), [])
+
+    def test_background_refresh_serves_the_previous_list(self):
+        results = [['first']]
+        recommendations = RecommendationCache(lambda user_id, count, threshold: results[0], ttl=60, size=10, background=True)
+        self.assertEqual(recommendations.get(self.user.id, 5, 0.5), ['first'])
+        results[0] = ['second']
+        with self.captureOnCommitCallbacks(execute=True):
+            recommendations.invalidate(self.user.id)
+        recommendations._executor.shutdown(wait=True)
+        self.assertEqual(recommendations.get(self.user.id, 5, 0.5), ['second'])
+        self.assertEqual(recommendations.stats()['background_refreshes'], 1)
+
+    def test_incremental_tastes_match_a_rebuild(self):
+        self.client.post(reverse('add-to-readlist'), {'book_id': self.books['Liked'].id})
+        self.client.post(reverse('add-rating'), {'book_id': self.books['Different'].id, 'rating': 5})
+        self.client.put(reverse('update-rating'), {'book_id': self.books['Different'].id, 'rating': 4})
+        batch = [self.books['Liked'].id, self.books['Similar'].id]
+        with self.assertNumQueries(15):
+            self.client.post(reverse('add-to-fav-batch'), {'book_ids': batch}, format='json')
+        taste = UserTaste.objects.get(user=self.user)
+        vector_sum, weight = compute_tastes([self.user.id])[self.user.id]
+        self.assertEqual(taste.weight, weight)
+        np.testing.assert_allclose(taste.vector_sum, vector_sum, atol=1e-6)
+
+        self.books['Different'].delete()
+        self.assertEqual(UserTaste.objects.get(user=self.user).weight, 2.5)
+        UserTaste.objects.all().delete()
+        call_command('rebuild_taste_vectors', stdout=StringIO())
+        self.assertEqual(UserTaste.objects.get(user=self.user).weight, 2.5)
+
+
+class BookNeighborsTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create_user(username=f'reader{i}', password='ReaderPass123') for i in range(3)]
+        self.dune, self.emma, self.persuasion, self.solaris = (
+            self.create_book(title=title) for title in ['Dune', 'Emma', 'Persuasion', 'Solaris']
+        )
+
+    def favorite(self, user, book):
+        self.client.force_authenticate(user=user)
+        self.client.post(reverse('add-to-fav'), {'book_id': book.id})
+
+    def also_liked(self, book):
+        response = self.client.get(reverse('readers-also-liked'), {'book_id': book.id})
+        return [row['title'] for row in response.data.get('recommendations', [])]
+
+    def test_full_build_and_delta_update(self):
+        self.favorite(self.users[0], self.emma)
+        self.favorite(self.users[0], self.persuasion)
+        self.favorite(self.users[1], self.emma)
+        self.favorite(self.users[1], self.persuasion)
+        self.favorite(self.users[1], self.dune)
+        call_command('build_book_neighbors', stdout=StringIO())
+        self.assertFalse(BookNeighbors.objects.filter(dirty=True).exists())
+        self.assertEqual(self.also_liked(self.emma), ['Persuasion', 'Dune'])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(readers_also_liked(self.emma.id)), 2)
+
+        self.favorite(self.users[2], self.dune)
+        self.favorite(self.users[2], self.solaris)
+        self.assertEqual(BookNeighbors.objects.filter(dirty=True).count(), 2)
+        call_command('build_book_neighbors', delta=True, stdout=StringIO())
+        self.assertEqual(self.also_liked(self.solaris), ['Dune'])
+        self.assertEqual(self.also_liked(self.dune), ['Solaris', 'Emma', 'Persuasion'])
+
+        delta = {book: self.also_liked(book) for book in [self.dune, self.emma, self.persuasion, self.solaris]}
+        call_command('build_book_neighbors', stdout=StringIO())
+        self.assertEqual({book: self.also_liked(book) for book in delta}, delta)
+
+
+class AsyncViewTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.book = self.create_book(title='Async Book')
+
+    async def test_read_views_run_on_the_event_loop(self):
+        for view in [AuthorView, BookView, CategoryView, CommentView]:
+            self.assertTrue(view.view_is_async)
+        response = await self.async_client.get(reverse('get-book'), {'s': 'async'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['title'] for book in response.json()['data']], ['Async Book'])
+        response = await self.async_client.get(reverse('get-author'), {'id': self.author.id})
+        self.assertEqual(response.json()['data'][0]['book_books'][0]['title'], 'Async Book')
+
+    async def test_sync_handlers_and_permissions_still_apply(self):
+        response = await self.async_client.get(reverse('get-comment'), {'book_id': self.book.id})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.post(reverse('make-comment'), {'book_id': self.book.id, 'content': 'Hi'}, headers=auth)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = await self.async_client.get(reverse('get-comment'), {'book_id': self.book.id}, headers=auth)
+        self.assertEqual(response.json()['data'][0]['user']['username'], 'reader')
+
+
+class ConditionalGetTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.book = self.create_book()
+
+    def test_unchanged_catalog_answers_304_until_a_write(self):
+        first = self.client.get(reverse('get-book'))
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('public', first['Cache-Control'])
+        self.assertIn('Accept', first['Vary'])
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse('get-book'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again.content, b'')
+        other_query = self.client.get(reverse('get-book'), {'limit': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other_query.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add-to-readlist'), {'book_id': self.book.id})
+        # Readlist counts are not part of the payload.
+        self.assertEqual(self.client.get(reverse('get-book'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add-to-fav'), {'book_id': self.book.id})
+        changed = self.client.get(reverse('get-book'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], etag)
+
+        # A stamp lost from the cache must not bring back an ETag it already issued.
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('get-book'), HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 200)
+
+    def test_comment_feed_is_private_and_versioned_per_book(self):
+        self.client.force_authenticate(user=self.user)
+        params = {'book_id': self.book.id}
+        first = self.client.get(reverse('get-comment'), params)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('get-comment'), params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('make-comment'), {'book_id': self.book.id, 'content': 'Hi'})
+        self.assertEqual(self.client.get(reverse('get-comment'), params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class BookFragmentCacheTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['book_fragments'].clear()
+        super().setUp()
+        self.books = [self.create_book(title=f'Book {i}') for i in range(3)]
+
+    def test_warm_list_reads_only_the_page_and_follows_writes(self):
+        first = self.client.get(reverse('get-book'))
+        with self.assertNumQueries(1):
+            warm = self.client.get(reverse('get-book'))
+        self.assertEqual(json.loads(warm.content), json.loads(first.content))
+        self.assertEqual(warm.data['data'][0]['title'], first.data['data'][0]['title'])
+
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add-rating'), {'book_id': self.books[0].id, 'rating': 4})
+            self.author.name = 'Renamed Author'
+            self.author.save()
+        books = {book['id']: book for book in self.client.get(reverse('get-book')).json()['data']}
+        self.assertEqual(books[self.books[0].id]['average_rating'], 4)
+        self.assertEqual(books[self.books[1].id]['author']['name'], 'Renamed Author')
+
+    def test_fragments_have_their_own_cache(self):
+        self.client.get(reverse('get-book'))
+        # Losing the default cache leaves the fragments, and their tokens, in place.
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get(reverse('get-book'))
+
+
+class ProfileViewTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+        self.books = [self.create_book(title=f'Book {i:02}') for i in range(12)]
+        FavBook.objects.bulk_create([FavBook(user=self.user, book=book) for book in self.books])
+        Rating.objects.create(user=self.user, book=self.books[0], rating=4)
+
+    def test_profile_runs_fixed_queries_and_caps_collections(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('get-user'))
+        data = response.data['data']
+        self.assertEqual([fav['book']['title'] for fav in data['fav_user']][:2], ['Book 11', 'Book 10'])
+        self.assertEqual(len(data['fav_user']), 10)
+        self.assertEqual(data['rating_user'][0]['rating'], 4)
+        self.assertIsNotNone(response.data['next']['fav_user'])
+        self.assertIsNone(response.data['next']['rating_user'])
+
+        rest = self.client.get(reverse('get-user-favorites'), {'cursor': response.data['next']['fav_user']})
+        self.assertEqual([fav['book']['title'] for fav in rest.data['data']], ['Book 01', 'Book 00'])
+        self.assertIsNone(rest.data['next'])
+
+
+class ToggleTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+        self.books = [self.create_book(title=f'Book {i}') for i in range(3)]
+
+    def test_toggle_flips_membership_and_counters(self):
+        book = self.books[0]
+        added = self.client.post(reverse('add-to-fav'), {'book_id': book.id})
+        self.assertEqual(added.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(BookStats.objects.get(book=book).favorite_count, 1)
+        removed = self.client.post(reverse('add-to-fav'), {'book_id': book.id})
+        self.assertEqual(removed.status_code, status.HTTP_200_OK)
+        self.assertFalse(removed.data['data'])
+        self.assertEqual(BookStats.objects.get(book=book).favorite_count, 0)
+        self.assertFalse(FavBook.objects.filter(user=self.user).exists())
+
+        missing = self.client.post(reverse('add-to-readlist'), {'book_id': 999999})
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_toggle_reports_each_state(self):
+        FavBook.objects.create(user=self.user, book=self.books[0])
+        ids = [self.books[0].id, self.books[1].id, self.books[1].id, 999999]
+        response = self.client.post(reverse('add-to-fav-batch'), {'book_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        states = {entry['book_id']: entry['present'] for entry in response.data['data']}
+        self.assertEqual(states, {self.books[0].id: False, self.books[1].id: True})
+        self.assertEqual(response.data['missing'], [999999])
+        self.assertEqual(list(FavBook.objects.filter(user=self.user).values_list('book_id', flat=True)), [self.books[1].id])
+        self.assertEqual(BookStats.objects.get(book=self.books[1]).favorite_count, 1)
+        # The FavBook row created above bypassed the counters, so the batch nets out at zero.
+        self.assertEqual(AuthorStats.objects.get(author=self.author).fav_book_count, 0)
+
+
+class BookStateTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+        self.books = [self.create_book(title=f'Book {i}') for i in range(3)]
+        FavBook.objects.create(user=self.user, book=self.books[0])
+        ReadList.objects.create(user=self.user, book=self.books[1])
+        Rating.objects.create(user=self.user, book=self.books[1], rating=4)
+
+    def test_state_for_a_page_of_books_in_three_queries(self):
+        ids = ','.join(str(book.id) for book in self.books)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('get-book-state'), {'book_ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [
+            {'book_id': self.books[0].id, 'favorite': True, 'readlist': False, 'user_rating': None},
+            {'book_id': self.books[1].id, 'favorite': False, 'readlist': True, 'user_rating': 4},
+            {'book_id': self.books[2].id, 'favorite': False, 'readlist': False, 'user_rating': None},
+        ])
+
+    def test_rejects_bad_ids(self):
+        response = self.client.get(reverse('get-book-state'), {'book_ids': '1,x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RatingImportTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+        self.books = [self.create_book(title=f'Book {i}') for i in range(3)]
+        Rating.objects.create(user=self.user, book=self.books[0], rating=2)
+        BookStats.objects.filter(book=self.books[0]).update(rating_sum=2, rating_count=1, rating_2=1)
+
+    def test_bulk_upsert_reports_row_errors(self):
+        payload = {'ratings': [
+            {'book_id': self.books[0].id, 'rating': 5},
+            [self.books[1].id, '3'],
+            {'book_id': 999999, 'rating': 4},
+            {'book_id': self.books[2].id, 'rating': 9},
+            {'book_id': 'x', 'rating': 1},
+            [self.books[1].id, 4],
+        ]}
+        response = self.client.post(reverse('add-rating-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['data']
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (1, 1, 0))
+        self.assertEqual([error['row'] for error in result['errors']], [1, 2, 3, 4])
+        self.assertEqual(
+            dict(Rating.objects.filter(user=self.user).values_list('book_id', 'rating')),
+            {self.books[0].id: 5, self.books[1].id: 4},
+        )
+        first = BookStats.objects.get(book=self.books[0])
+        self.assertEqual((first.rating_sum, first.rating_count, first.rating_2, first.rating_5), (5, 1, 0, 1))
+
+    def test_bulk_upsert_counts_in_a_fixed_number_of_queries(self):
+        books = [self.create_book(title=f'Extra {i}') for i in range(20)]
+        before = AuthorStats.objects.get(author=self.author).rating_sum
+        payload = {'ratings': [[book.id, i % 6] for i, book in enumerate(books)]}
+        with self.assertNumQueries(13):
+            response = self.client.post(reverse('add-rating-bulk'), payload, format='json')
+        self.assertEqual(response.data['data']['created'], 20)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).rating_sum,
+            before + sum(i % 6 for i in range(20)),
+        )
+        self.assertEqual(sum(BookStats.objects.values_list('rating_count', flat=True)), 21)
+
+    def test_bulk_rejects_a_bare_list(self):
+        response = self.client.post(reverse('add-rating-bulk'), [[self.books[1].id, 4]], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(f'book_id,rating\n{self.books[1].id},4\n{self.books[2].id},oops\n')
+        self.addCleanup(os.remove, handle.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_ratings', handle.name, user='reader', stdout=out, stderr=err)
+        self.assertIn('Created 1', out.getvalue())
+        self.assertIn('Line 3', err.getvalue())
+        self.assertEqual(Rating.objects.get(user=self.user, book=self.books[1]).rating, 4)
+
+    def test_command_reports_jsonl_file_lines(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write(f'{{"book_id": {self.books[1].id}, "rating": 4}}\n\n{{oops\n{{"book_id": {self.books[2].id}, "rating": 9}}\n')
+        self.addCleanup(os.remove, handle.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_ratings', handle.name, user='reader', stdout=out, stderr=err)
+        self.assertIn('Created 1', out.getvalue())
+        self.assertEqual([line.split(':')[0] for line in err.getvalue().splitlines()], ['Line 3', 'Line 4'])
+
+
+class LazyResourceTests(TestCase):
+    def test_url_loading_does_not_load_models(self):
+        reverse('semantic-search')
+        self.assertFalse(embeddings.embedding_model.loaded)
+        self.assertFalse(embeddings.supabase_client.loaded)
+
+    def test_resource_loads_once_and_is_timed(self):
+        calls = []
+        resource = LazyResource('dummy', lambda: calls.append(1) or 'value')
+        self.assertEqual(resource.get(), 'value')
+        self.assertEqual(resource.get(), 'value')
+        self.assertEqual(len(calls), 1)
+        self.assertIsNotNone(resource.load_seconds)
+
+
+class QueryEmbeddingCacheTests(TestCase):
+    def test_lru_eviction_and_normalized_keys(self):
+        embedding_cache = QueryEmbeddingCache(max_entries=2, ttl=60)
+        embedding_cache.set('Pride  and Prejudice', [1.0, 2.0])
+        embedding_cache.set('emma', [3.0, 4.0])
+        self.assertEqual(embedding_cache.get('pride and prejudice').dtype.name, 'float32')
+        embedding_cache.set('frankenstein', [5.0, 6.0])
+
+        self.assertIsNone(embedding_cache.get('emma'))
+        self.assertIsNotNone(embedding_cache.get('frankenstein'))
+        stats = embedding_cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (2, 2, 1))
+        self.assertEqual(stats['bytes'], 16)
+
+    def test_shared_entries_are_reused(self):
+        QueryEmbeddingCache(max_entries=2, ttl=60, shared=True).set('dune', [1.0, 0.5])
+        other_worker = QueryEmbeddingCache(max_entries=2, ttl=60, shared=True)
+        self.assertEqual(other_worker.get('Dune').tolist(), [1.0, 0.5])
+        self.assertEqual(other_worker.stats()['shared_hits'], 1)
+
+
+class EmbeddingBatcherTests(TestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        batch_sizes = []
+
+        def embed_batch(texts):
+            batch_sizes.append(len(texts))
+            return [[float(len(text)), 1.0] for text in texts]
+
+        batcher = EmbeddingBatcher(embed_batch, max_batch_size=8, max_wait=0.05)
+        results = {}
+        threads = [
+            threading.Thread(target=lambda text=text: results.setdefault(text, batcher.submit(text, timeout=5)))
+            for text in ['a', 'bb', 'ccc', 'dddd']
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({text: vector[0] for text, vector in results.items()}, {'a': 1, 'bb': 2, 'ccc': 3, 'dddd': 4})
+        self.assertLess(len(batch_sizes), 4)
+        self.assertEqual(sum(batch_sizes), 4)
+
+    def test_mean_pool_ignores_padding(self):
+        hidden = torch.tensor([[[1.0, 1.0], [3.0, 3.0], [100.0, 100.0]]])
+        mask = torch.tensor([[1, 1, 0]])
+        self.assertEqual(mean_pool(hidden, mask).tolist(), [[2.0, 2.0]])
+
+
+class InferenceModeTests(TestCase):
+    def test_int8_mode_quantizes_linear_layers(self):
+        model = torch.nn.Sequential(torch.nn.Linear(8, 4))
+        quantized = quantize_model(model)
+        self.assertIsInstance(quantized[0], torch.ao.nn.quantized.dynamic.Linear)
+        self.assertIsInstance(model[0], torch.nn.Linear)
+
+        inputs = torch.randn(5, 8)
+        with torch.no_grad():
+            agreement = cosine_agreement(quantized(inputs).numpy(), model(inputs).numpy())
+        self.assertGreater(agreement.min(), 0.95)
+
+    def test_mode_is_part_of_the_model_identity(self):
+        fp32 = model_identity()
+        with self.settings(EMBEDDING_INFERENCE_MODE='int8'):
+            self.assertNotEqual(model_identity(), fp32)
+        with self.assertRaises(ImproperlyConfigured):
+            load_model('fp16')
+
+
+class EmbedBooksCommandTests(BookFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.books = [self.create_book(title=f'Book {i}') for i in range(5)]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, 'checkpoint.json')
+
+    def fake_embedding(self, texts):
+        self.embedded.extend(texts)
+        return torch.ones((len(texts), settings.EMBEDDING_DIMENSIONS))
+
+    def run_command(self, **options):
+        self.embedded = []
+        with mock.patch('BookApp.embeddings.get_embedding', side_effect=self.fake_embedding):
+            call_command('embed_books', checkpoint=self.checkpoint, batch_size=2, stdout=StringIO(), **options)
+        return self.embedded
+
+    def test_embeds_missing_and_skips_current(self):
+        self.assertEqual(len(self.run_command()), 5)
+        self.assertFalse(Book.objects.filter(embedding__isnull=True).exists())
+        self.assertEqual(self.run_command(), [])
+
+        Book.objects.filter(pk=self.books[0].pk).update(title='Renamed')
+        self.assertEqual(self.run_command(), ['Renamed. Test Summary'])
+
+    def test_reembedding_refreshes_tastes(self):
+        book = self.books[0]
+        book.embedding = vector(1.0, 0.0)
+        book.save()
+        toggle('favorite', self.user.id, [book.id])
+        self.run_command()
+        expected = np.full(settings.EMBEDDING_DIMENSIONS, 1 / np.sqrt(settings.EMBEDDING_DIMENSIONS))
+        np.testing.assert_allclose(UserTaste.objects.get(user=self.user).vector_sum, expected, rtol=1e-5)
+
+        # Deleting the book takes back the new vector, not the old one.
+        book.delete()
+        self.assertFalse(UserTaste.objects.filter(user=self.user, vector_sum__isnull=False).exists())
+
+    def test_refuses_to_share_a_checkpoint_with_a_running_job(self):
+        with FileLock(f'{self.checkpoint}.run.lock'):
+            with self.assertRaises(CommandError):
+                self.run_command()
+        self.assertEqual(len(self.run_command()), 5)
 
-# Create your tests here.
+    def test_resumes_after_checkpoint(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'model': model_identity(), 'shards': {'0/1': self.books[2].id}}, f)
+        self.assertEqual(len(self.run_command()), 2)
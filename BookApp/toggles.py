@@ -0,0 +1,90 @@
+from django.db import connection, transaction
+from . import neighbors, stats, taste
+from .models import Book, FavBook, ReadList
+
+MAX_BATCH_SIZE = 100
+
+# Per toggle kind: the membership table, the BookStats counter it moves and
+# the taste hook.
+KINDS = {
+    'favorite': (FavBook, 'favorite_count', taste.record_favorites),
+    'readlist': (ReadList, 'readlist_count', taste.record_readlists),
+}
+
+# PostgreSQL runs the delete and the insert as one statement. The insert
+# selects from the book table instead of relying on the foreign key alone,
+# because Django creates foreign keys DEFERRABLE INITIALLY DEFERRED and a
+# missing book would only fail at COMMIT.
+POSTGRES_TOGGLE = """
+    WITH deleted AS (
+        DELETE FROM {table} WHERE user_id = %s AND book_id = ANY(%s) RETURNING book_id
+    ), inserted AS (
+        INSERT INTO {table} (user_id, book_id)
+        SELECT %s, id FROM {book} WHERE id = ANY(%s) AND id NOT IN (SELECT book_id FROM deleted)
+        ON CONFLICT DO NOTHING
+        RETURNING book_id
+    )
+    SELECT book_id, false FROM deleted
+    UNION ALL
+    SELECT book_id, true FROM inserted
+"""
+DELETE_RETURNING = "DELETE FROM {table} WHERE user_id = %s AND book_id IN ({ids}) RETURNING book_id"
+INSERT_RETURNING = """
+    INSERT INTO {table} (user_id, book_id)
+    SELECT %s, id FROM {book} WHERE id IN ({ids})
+    ON CONFLICT DO NOTHING
+    RETURNING book_id
+"""
+
+
+def _flip(model, user_id, book_ids):
+    """{book_id: now_present} for the rows this call deleted or inserted."""
+    names = {
+        'table': connection.ops.quote_name(model._meta.db_table),
+        'book': connection.ops.quote_name(Book._meta.db_table),
+    }
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_TOGGLE.format(**names), [user_id, book_ids, user_id, book_ids])
+            return dict(cursor.fetchall())
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        cursor.execute(DELETE_RETURNING.format(ids=placeholders, **names), [user_id, *book_ids])
+        changes = {book_id: False for book_id, in cursor.fetchall()}
+        rest = [book_id for book_id in book_ids if book_id not in changes]
+        if rest:
+            placeholders = ', '.join(['%s'] * len(rest))
+            cursor.execute(INSERT_RETURNING.format(ids=placeholders, **names), [user_id, *rest])
+            changes.update((book_id, True) for book_id, in cursor.fetchall())
+        return changes
+
+
+def toggle(kind, user_id, book_ids):
+    """
+    Flip whether each of `book_ids` is in the user's favorites or readlist
+    ('favorite' or 'readlist'), in one transaction, and keep the counters,
+    taste vector and neighbour lists in step.
+
+    Returns {book_id: now_present}. Books that do not exist are left out.
+    A book a concurrent request toggled first reports its current state and
+    is not counted twice.
+    """
+    model, counter, record_taste = KINDS[kind]
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        return {}
+    with transaction.atomic():
+        changes = _flip(model, user_id, book_ids)
+        if changes:
+            deltas = {book_id: 1 if present else -1 for book_id, present in changes.items()}
+            stats.apply_many({book_id: {counter: delta} for book_id, delta in deltas.items()})
+            record_taste(user_id, deltas)
+            neighbors.mark_dirty(changes)
+            taste.recommendation_cache.invalidate(user_id)
+
+    state = dict(changes)
+    unchanged = [book_id for book_id in book_ids if book_id not in changes]
+    if unchanged:
+        present = set(model.objects.filter(user_id=user_id, book_id__in=unchanged).values_list('book_id', flat=True))
+        existing = set(Book.objects.filter(id__in=unchanged).values_list('id', flat=True))
+        state.update((book_id, book_id in present) for book_id in unchanged if book_id in existing)
+    return state
@@ -1,10 +1,14 @@
 from django.urls import path
 
-from .views import AuthorView,ProfileView,CategoryView,ProfileUpdateView,ProfileDeleteView,BookView,FavoriteView,CommentView,RatingView,ReadListView,SemanticSearchView,RecommendBooksView
+from .views import AuthorView,ProfileView,ProfileCollectionView,ToggleBatchView,BookStateView,RatingBulkView,CategoryView,ProfileUpdateView,ProfileDeleteView,BookView,FavoriteView,CommentView,RatingView,ReadListView,SemanticSearchView,RecommendBooksView,ReadersAlsoLikedView,CacheStatsView
 
 urlpatterns = [
     path('get-author/', AuthorView.as_view(), name='get-author'),
     path('get-user/', ProfileView.as_view(), name='get-user'),
+    path('get-user/favorites/', ProfileCollectionView.as_view(collection='fav_user'), name='get-user-favorites'),
+    path('get-user/readlist/', ProfileCollectionView.as_view(collection='read_user'), name='get-user-readlist'),
+    path('get-user/comments/', ProfileCollectionView.as_view(collection='comment_user'), name='get-user-comments'),
+    path('get-user/ratings/', ProfileCollectionView.as_view(collection='rating_user'), name='get-user-ratings'),
     path('get-categories/', CategoryView.as_view(), name='get-categories'),
     path('reset-password/', ProfileUpdateView.as_view(), name='reset-password'),
     path('delete-user/', ProfileDeleteView.as_view(), name='delete-user'),
@@ -15,10 +19,16 @@ urlpatterns = [
     path('add-rating/',RatingView.as_view(),name='add-rating'),
     path('get-rating/',RatingView.as_view(),name='get-rating'),
     path('update-rating/',RatingView.as_view(),name='update-rating'),
+    path('add-rating/bulk/', RatingBulkView.as_view(), name='add-rating-bulk'),
     path('add-to-readlist/',ReadListView.as_view(),name='add-to-readlist'),
+    path('add-to-fav/batch/', ToggleBatchView.as_view(kind='favorite'), name='add-to-fav-batch'),
+    path('add-to-readlist/batch/', ToggleBatchView.as_view(kind='readlist'), name='add-to-readlist-batch'),
     path('get-fav/',FavoriteView.as_view(),name='get-fav'),
     path('get-readlist/',ReadListView.as_view(),name='get-readlist'),
     path('get-readlist/',ReadListView.as_view(),name='get-readlist'),
+    path('get-book-state/', BookStateView.as_view(), name='get-book-state'),
     path('semantic-search/', SemanticSearchView.as_view(), name='semantic-search'),
     path('recommended-books/', RecommendBooksView.as_view(), name='recommend-books'),
+    path('readers-also-liked/', ReadersAlsoLikedView.as_view(), name='readers-also-liked'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
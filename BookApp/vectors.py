@@ -0,0 +1,374 @@
+import hashlib
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .caches import VersionStamp, register_stats
+from .models import Book
+
+# How long a worker can lag behind and still catch up from the change log
+# instead of reloading every embedding.
+CHANGE_LOG_TIMEOUT = 60 * 60 * 24
+MAX_REPLAY = 1000
+
+
+def content_fingerprint():
+    """
+    A fingerprint of the embeddings in the database, without reading them:
+    how many books have one, the highest such id, and a digest of their ids
+    and embedding_hash values (which embed_books sets with every embedding).
+    """
+    digest = hashlib.sha1()
+    count = max_id = 0
+    rows = Book.objects.exclude(embedding=None).order_by('id').values_list('id', 'embedding_hash')
+    for book_id, embedding_hash in rows.iterator(chunk_size=5000):
+        digest.update(f'{book_id}:{embedding_hash or ""};'.encode())
+        count += 1
+        max_id = book_id
+    return f'{count}:{max_id}:{digest.hexdigest()}'
+
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class BookVectorIndex:
+    """
+    Exact cosine search over Book.embedding, held in-process as one contiguous
+    float32 matrix of unit-length rows.
+
+    Book saves and deletes push the changed ids onto a change log in the Django
+    cache and bump a version stamp (see signals.py). Each worker replays the
+    log on its next search and only re-reads those rows; if it fell too far
+    behind or log entries were evicted it reloads everything. The log and the
+    stamp only reach other processes through a shared default cache.
+
+    A saved index (`path`) is used at startup only if its content_fingerprint()
+    still matches the database; version stamps can be lost and reseeded, so
+    the version it was saved at proves nothing.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.stamp = VersionStamp('bookapp:vector-index:version')
+        self._lock = threading.Lock()
+        self._version = None
+        # content_fingerprint() of what a full load or the saved file held;
+        # None once changes have been replayed on top.
+        self._fingerprint = None
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+
+    def _change_key(self, version):
+        return f'bookapp:vector-index:changes:{version}'
+
+    def notify_changed(self, book_ids):
+        version = self.stamp.bump()
+        cache.set(self._change_key(version), list(book_ids), timeout=CHANGE_LOG_TIMEOUT)
+
+    # Storage ---------------------------------------------------------------
+
+    def _reset(self, ids, vectors):
+        self._matrix = vectors
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._positions = {book_id: row for row, book_id in enumerate(ids)}
+        self._size = len(ids)
+
+    def _upsert(self, book_id, vector):
+        vector = normalize(vector)
+        if vector.shape[0] != self._matrix.shape[1]:
+            if self._size:
+                return self._remove(book_id)
+            self._matrix = np.empty((0, vector.shape[0]), dtype=np.float32)
+            self._ids = np.empty(0, dtype=np.int64)
+        row = self._positions.get(book_id)
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                # Grow geometrically so a stream of inserts stays amortized O(1).
+                capacity = max(16, 2 * self._matrix.shape[0])
+                matrix = np.empty((capacity, vector.shape[0]), dtype=np.float32)
+                ids = np.empty(capacity, dtype=np.int64)
+                matrix[:self._size] = self._matrix[:self._size]
+                ids[:self._size] = self._ids[:self._size]
+                self._matrix, self._ids = matrix, ids
+            row = self._size
+            self._size += 1
+            self._positions[book_id] = row
+            self._ids[row] = book_id
+        self._matrix[row] = vector
+
+    def _remove(self, book_id):
+        row = self._positions.pop(book_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            # Move the last row into the hole to keep the live rows contiguous.
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = self._ids[last]
+            self._positions[int(self._ids[row])] = row
+        self._size = last
+
+    def _load_all(self):
+        # Book.embedding decodes to np.frombuffer views, so this is one copy
+        # of raw float32 bytes into the matrix and no per-element objects.
+        rows = Book.objects.exclude(embedding=None).values_list('id', 'embedding').iterator(chunk_size=2000)
+        ids = []
+        vectors = []
+        for book_id, embedding in rows:
+            ids.append(book_id)
+            vectors.append(embedding)
+        if not vectors:
+            return self._reset([], np.empty((0, 0), dtype=np.float32))
+        matrix = np.vstack(vectors).astype(np.float32, copy=False)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        self._reset(ids, matrix)
+
+    # Persistence -----------------------------------------------------------
+
+    def _arrays(self):
+        return {'matrix': self._matrix[:self._size], 'ids': self._ids[:self._size]}
+
+    def _restore(self, arrays):
+        self._reset(arrays['ids'].tolist(), arrays['matrix'].copy())
+
+    def save(self, path=None):
+        """
+        Write the index to `path` (an .npz file), replacing it atomically.
+        An index that has replayed changes since its last full load cannot
+        vouch for its contents and is not written.
+        """
+        path = path or self.path
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with self._lock:
+            if self._fingerprint is None:
+                return False
+            with open(tmp, 'wb') as f:
+                np.savez(f, fingerprint=self._fingerprint, **self._arrays())
+        os.replace(tmp, path)
+        return True
+
+    def _load_saved(self, version):
+        # Caller holds the lock.
+        try:
+            with np.load(self.path) as saved:
+                arrays = {name: saved[name] for name in saved.files}
+            fingerprint = str(arrays['fingerprint'])
+        except (OSError, ValueError, KeyError):
+            return
+        # Read the stamp before the fingerprint: a write that lands in between
+        # either shows in the fingerprint or is replayed after the next bump.
+        if fingerprint == content_fingerprint():
+            self._restore(arrays)
+            self._fingerprint = fingerprint
+            self._version = version
+
+    def _replay(self, book_ids):
+        self._fingerprint = None
+        found = dict(Book.objects.filter(id__in=book_ids).values_list('id', 'embedding'))
+        for book_id in book_ids:
+            embedding = found.get(book_id)
+            if embedding is not None:
+                self._upsert(book_id, embedding)
+            else:
+                self._remove(book_id)
+
+    def sync(self):
+        version = self.stamp.current()
+        with self._lock:
+            if self._version == version:
+                return
+            if self._version is None and self.path:
+                self._load_saved(version)
+                if self._version == version:
+                    return
+            behind = None if self._version is None else version - self._version
+            logs = {}
+            if behind is not None and 0 < behind <= MAX_REPLAY:
+                keys = [self._change_key(v) for v in range(self._version + 1, version + 1)]
+                logs = cache.get_many(keys)
+                if len(logs) != len(keys):
+                    logs = {}
+            if logs:
+                self._replay({book_id for ids in logs.values() for book_id in ids})
+                self._version = version
+                return
+            # Fingerprint first, so a write racing the load can only make it stale.
+            self._fingerprint = content_fingerprint()
+            self._load_all()
+            self._version = version
+        if self.path:
+            self.save()
+
+    # Queries ---------------------------------------------------------------
+
+    def _score(self, query):
+        # Caller holds the lock.
+        return self._matrix[:self._size] @ query, self._ids[:self._size].copy()
+
+    def search(self, vector, match_threshold=0.7, match_count=10):
+        """
+        Return up to `match_count` (book_id, similarity) pairs with cosine
+        similarity above `match_threshold`, most similar first.
+        """
+        self.sync()
+        query = normalize(vector)
+        with self._lock:
+            if not self._size or match_count <= 0 or query.shape[0] != self._matrix.shape[1]:
+                return []
+            scores, ids = self._score(query)
+        candidates = np.flatnonzero(scores > match_threshold)
+        if len(candidates) > match_count:
+            top = np.argpartition(-scores[candidates], match_count - 1)[:match_count]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(ids[row]), float(scores[row])) for row in order]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'size': self._size,
+                'dimensions': int(self._matrix.shape[1]) if self._matrix.ndim == 2 else 0,
+                'bytes': int(self._matrix.nbytes),
+            }
+
+
+def spherical_kmeans(vectors, clusters, iterations=10, seed=0):
+    """Unit-length centroids of `clusters` groups of unit-length `vectors`."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_clusters(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # An empty cluster keeps its previous centroid.
+        np.divide(sums, norms, out=centroids, where=norms > 0)
+    return centroids
+
+
+def assign_clusters(vectors, centroids, chunk_size=8192):
+    """Index of the most similar centroid for each row, in bounded-memory chunks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFBookVectorIndex(BookVectorIndex):
+    """
+    Approximate cosine search: the embeddings are clustered with spherical
+    k-means into `nlist` inverted lists (sqrt(n) of them when nlist is 0) and
+    a query only scores the rows of its `nprobe` closest lists. Raising nprobe
+    trades latency for recall; nprobe >= nlist is exact search.
+
+    New and changed books are assigned to their closest existing centroid.
+    The centroids are retrained on a full reload once the index has grown to
+    twice the size they were trained on. Indexes too small to be worth
+    clustering are searched exactly.
+    """
+
+    MIN_LIST_SIZE = 4
+    TRAIN_SAMPLES_PER_LIST = 256
+
+    def __init__(self, path=None, nlist=0, nprobe=8):
+        super().__init__(path)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._centroids = None
+        self._trained_size = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+
+    def _train(self):
+        vectors = self._matrix[:self._size]
+        nlist = self.nlist or int(np.sqrt(self._size))
+        if nlist < 2 or self._size < nlist * self.MIN_LIST_SIZE:
+            self._centroids = None
+            return
+        sample_size = min(self._size, nlist * self.TRAIN_SAMPLES_PER_LIST)
+        sample = vectors[np.random.default_rng(0).choice(self._size, sample_size, replace=False)]
+        self._centroids = spherical_kmeans(sample, nlist)
+        self._trained_size = self._size
+
+    def _assign_all(self):
+        self._assignments = np.full(self._matrix.shape[0], -1, dtype=np.int32)
+        if self._centroids is not None:
+            self._assignments[:self._size] = assign_clusters(self._matrix[:self._size], self._centroids)
+
+    def _reset(self, ids, vectors):
+        super()._reset(ids, vectors)
+        centroids = self._centroids
+        if centroids is None or centroids.shape[1] != vectors.shape[1] or self._size >= 2 * self._trained_size:
+            self._train()
+        self._assign_all()
+
+    def _upsert(self, book_id, vector):
+        super()._upsert(book_id, vector)
+        row = self._positions.get(book_id)
+        if row is None:
+            return
+        if len(self._assignments) < self._matrix.shape[0]:
+            assignments = np.full(self._matrix.shape[0], -1, dtype=np.int32)
+            assignments[:len(self._assignments)] = self._assignments
+            self._assignments = assignments
+        if self._centroids is not None and self._centroids.shape[1] != self._matrix.shape[1]:
+            self._centroids = None
+        if self._centroids is not None:
+            self._assignments[row] = np.argmax(self._centroids @ self._matrix[row])
+
+    def _remove(self, book_id):
+        row = self._positions.get(book_id)
+        last = self._size - 1
+        super()._remove(book_id)
+        if row is not None and row != last:
+            self._assignments[row] = self._assignments[last]
+
+    def _arrays(self):
+        arrays = super()._arrays()
+        if self._centroids is not None:
+            arrays['centroids'] = self._centroids
+            arrays['trained_size'] = np.int64(self._trained_size)
+        return arrays
+
+    def _restore(self, arrays):
+        if 'centroids' in arrays:
+            self._centroids = arrays['centroids']
+            self._trained_size = int(arrays['trained_size'])
+        super()._restore(arrays)
+
+    def _score(self, query):
+        # Caller holds the lock.
+        centroids = self._centroids
+        if centroids is None or self.nprobe >= len(centroids):
+            return super()._score(query)
+        probed = np.zeros(len(centroids), dtype=bool)
+        probed[np.argpartition(-(centroids @ query), self.nprobe - 1)[:self.nprobe]] = True
+        rows = np.flatnonzero(probed[self._assignments[:self._size]])
+        return self._matrix[rows] @ query, self._ids[rows]
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(
+                nlist=0 if self._centroids is None else len(self._centroids),
+                nprobe=self.nprobe,
+                trained_size=self._trained_size,
+            )
+        return stats
+
+
+def make_index():
+    if settings.VECTOR_INDEX == 'ivf':
+        return IVFBookVectorIndex(settings.VECTOR_INDEX_PATH, settings.VECTOR_INDEX_NLIST, settings.VECTOR_INDEX_NPROBE)
+    return BookVectorIndex(settings.VECTOR_INDEX_PATH)
+
+
+book_vector_index = make_index()
+register_stats('book_vector_index', book_vector_index.stats)